@@ -0,0 +1,88 @@
+# import_time.py
+# islandora7_rest benchmarks
+# Copyright (c) 2019 The University of Kansas
+#
+# How long `import islandora7_rest` (and friends) takes in a fresh interpreter - what every
+# short-lived cron job pays before doing anything.
+#
+# Usage:
+# python benchmarks/import_time.py [--runs 20] [--top 10] [--json results.json]
+#
+# Each statement runs in its own `python -X importtime` process, --runs times.  Reported: median and
+# best wall time of the whole process, the median cumulative import time python reports for the
+# package itself, and the slowest modules it pulled in.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATEMENTS = [
+    ('baseline', 'pass'),
+    ('package', 'import islandora7_rest'),
+    ('client', 'from islandora7_rest import IslandoraClient'),
+    ('ku', 'from islandora7_rest.ku import IslandoraClientKU'),
+    ('config', 'from islandora7_rest import config; config.ISLANDORA_REST'),
+]
+
+
+def importtime(stderr):
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative_us)
+    return modules
+
+
+def measure(statement, runs):
+    walls = []
+    package = []
+    slowest = {}
+    environment = dict(os.environ, PYTHONPATH=ROOT)
+    for _ in range(runs):
+        started = time.perf_counter()
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=ROOT, env=environment,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+        walls.append(time.perf_counter() - started)
+        if process.returncode:
+            raise Exception("{!r} failed:\n{}".format(statement, process.stderr))
+        modules = importtime(process.stderr)
+        package.append(modules.get('islandora7_rest', 0))
+        for name, cumulative in modules.items():
+            slowest[name] = max(slowest.get(name, 0), cumulative)
+    return {
+        'wall_median_ms': statistics.median(walls) * 1000,
+        'wall_best_ms': min(walls) * 1000,
+        'package_import_median_ms': statistics.median(package) / 1000,
+        'slowest': sorted(slowest.items(), key=lambda item: -item[1]),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='islandora7_rest import time')
+    parser.add_argument('--runs', type=int, default=20, help='fresh interpreters per statement')
+    parser.add_argument('--top', type=int, default=8, help='slowest modules to list')
+    parser.add_argument('--json', help='also write the results here')
+    args = parser.parse_args()
+
+    results = {}
+    for name, statement in STATEMENTS:
+        result = measure(statement, args.runs)
+        result['slowest'] = result['slowest'][:args.top]
+        results[name] = result
+        print('{:<10} {:>8.1f} ms median  {:>8.1f} ms best  islandora7_rest {:>7.1f} ms   {}'.format(
+            name, result['wall_median_ms'], result['wall_best_ms'], result['package_import_median_ms'], statement))
+        for module, cumulative in result['slowest']:
+            print('{:>14.1f} ms  {}'.format(cumulative / 1000, module))
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
@@ -0,0 +1,358 @@
+# mock_server.py
+# islandora7_rest benchmarks
+# Copyright (c) 2019 The University of Kansas
+#
+# A stand-in for Islandora REST (v1/ and KU's v1ku/), good enough to measure the client against.
+# Nothing is real: objects, datastreams and Solr docs are made up on request, relationships
+# live in a dictionary.  Latency and errors can be dialled in.
+#
+# Usage:
+# python benchmarks/mock_server.py [--port 8000] [--latency 0.01] [--error-rate 0.01]
+#   then point a client at http://localhost:8000/islandora/rest/
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote_plus, urlsplit
+
+PREFIX = '/islandora/rest/'
+MODEL_NS = 'info:fedora/fedora-system:def/model#'
+RELS_NS = 'info:fedora/fedora-system:def/relations-external#'
+_SHARD = re.compile(r'PID:\[(\*|"[^"]*") TO (\*|"[^"]*")([\]}])')
+
+
+class MockRepository(object):
+    """ Settings and state shared by the request handlers """
+
+    def __init__(self, docs=10000, datastream_size=1048576, field_size=64, latency=0.0, jitter=0.0,
+                 error_rate=0.0, error_status=503):
+        self.docs = docs
+        self.datastream_size = datastream_size
+        self.field_size = field_size
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.relationships = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        # Datastream content is one block repeated, so the checksum only gets worked out once
+        self.block = bytes(range(256)) * 256
+        md5 = hashlib.md5()
+        remaining = datastream_size
+        while remaining:
+            piece = self.block[:min(remaining, len(self.block))]
+            md5.update(piece)
+            remaining -= len(piece)
+        self.checksum = md5.hexdigest()
+
+    @staticmethod
+    def pid(index):
+        return 'bench:{:07d}'.format(index)
+
+    def get_relationships(self, pid):
+        with self.lock:
+            if pid not in self.relationships:
+                self.relationships[pid] = [
+                    (MODEL_NS, 'hasModel', 'islandora:sp_basic_image', False),
+                    (RELS_NS, 'isMemberOfCollection', 'bench:collection', False),
+                ]
+            return list(self.relationships[pid])
+
+    def datastream_info(self, pid, dsid):
+        return {
+            'dsid': dsid, 'label': '{} datastream'.format(dsid), 'state': 'A', 'size': self.datastream_size,
+            'mimeType': 'application/octet-stream', 'controlGroup': 'M', 'versionable': True,
+            'created': '2019-01-01T00:00:00.000Z', 'checksumType': 'MD5', 'checksum': self.checksum,
+        }
+
+    def object_profile(self, pid):
+        return {
+            'pid': pid, 'label': 'Object {}'.format(pid), 'owner': 'admin', 'state': 'A',
+            'models': ['islandora:sp_basic_image', 'fedora-system:FedoraObject-3.0'],
+            'created': '2019-01-01T00:00:00.000Z', 'modified': '2019-01-02T00:00:00.000Z',
+            'datastreams': [self.datastream_info(pid, dsid) for dsid in ('DC', 'RELS-EXT', 'MODS', 'OBJ')],
+        }
+
+    def solr_doc(self, index, fields):
+        pid = self.pid(index)
+        doc = {}
+        for field in fields:
+            if field == 'PID':
+                doc[field] = pid
+            elif field == 'RELS_EXT_hasModel_uri_ms':
+                doc[field] = ['info:fedora/islandora:sp_basic_image']
+            elif field == 'RELS_EXT_isMemberOfCollection_uri_ms':
+                doc[field] = ['info:fedora/bench:collection']
+            elif field in ('fgs_lastModifiedDate', 'fgs_createdDate'):
+                doc[field] = '2019-01-02T00:00:{:02d}.{:03d}Z'.format(index % 60, index % 1000)
+            elif field == 'fedora_datastreams_ms':
+                doc[field] = ['DC', 'RELS-EXT', 'MODS', 'OBJ']
+            elif '*' not in field:
+                doc[field] = 'x' * self.field_size
+        return doc
+
+    def solr_range(self, fq):
+        # Only PID range filters (as made by IslandoraClient.pid_range_shards) are understood
+        low, high = 0, self.docs
+        for flt in fq:
+            match = _SHARD.match(flt)
+            if not match:
+                continue
+            if match.group(1) != '*':
+                low = max(low, self._bound(match.group(1).strip('"')))
+            if match.group(2) != '*':
+                high = min(high, self._bound(match.group(2).strip('"'), inclusive=match.group(3) == ']'))
+        return low, max(low, high)
+
+    def _bound(self, value, inclusive=False):
+        # First index whose PID sorts after value (or at it, unless inclusive)
+        low, high = 0, self.docs
+        while low < high:
+            middle = (low + high) // 2
+            if self.pid(middle) < value or (inclusive and self.pid(middle) == value):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes - with Nagle on, the body waits for the client's
+    # delayed ACK (~40 ms), which would swamp everything being measured
+    disable_nagle_algorithm = True
+    repository = None
+
+    def log_message(self, format, *args):
+        pass
+
+    # Plumbing
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            remaining = length
+            while remaining:
+                remaining -= len(self.rfile.read(min(remaining, 1048576)))
+        elif self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                self.rfile.read(size + 2)
+                if not size:
+                    break
+
+    def _send(self, status, body=b'', content_type='application/json'):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        repository = self.repository
+        with repository.lock:
+            repository.requests += 1
+        if repository.latency or repository.jitter:
+            time.sleep(repository.latency + random.uniform(0, repository.jitter))
+        parts = urlsplit(self.path)
+        if method in ('POST', 'PUT', 'DELETE'):
+            self._body()
+        if not parts.path.startswith(PREFIX):
+            return self._send(404, {'message': 'Not found'})
+        if repository.error_rate and random.random() < repository.error_rate:
+            return self._send(repository.error_status, {'message': 'Injected error'})
+        params = parse_qs(parts.query)
+        api, _, path = parts.path[len(PREFIX):].partition('/')
+        segments = [unquote_plus(segment) for segment in path.split('/')]
+        if api == 'v1':
+            return self._v1(method, segments, params)
+        if api == 'v1ku':
+            return self._v1ku(method, segments, params)
+        return self._send(404, {'message': 'Not found'})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    # v1/
+
+    def _v1(self, method, segments, params):
+        repository = self.repository
+        if segments[0] == 'solr':
+            return self._solr(segments[1], params)
+        if segments[0] != 'object':
+            return self._send(404, {'message': 'Not found'})
+        if len(segments) == 1:
+            return self._send(201, repository.object_profile('bench:new'))
+        pid = segments[1]
+        if len(segments) == 2:
+            if method == 'DELETE':
+                return self._send(200)
+            return self._send(200, repository.object_profile(pid))
+        if segments[2] == 'relationship':
+            if method == 'GET':
+                return self._send(200, [{
+                    'predicate': {'value': predicate, 'alias': None, 'namespace': ns},
+                    'object': {'value': object, 'literal': literal},
+                } for ns, predicate, object, literal in repository.get_relationships(pid)])
+            return self._send(201 if method == 'POST' else 200)
+        if segments[2] == 'datastream':
+            if len(segments) < 4 or not segments[3]:
+                return self._send(201, repository.datastream_info(pid, 'NEW'))
+            dsid = segments[3]
+            if method in ('POST', 'PUT'):
+                return self._send(200, repository.datastream_info(pid, dsid))
+            if method == 'DELETE':
+                return self._send(200)
+            if params.get('content', ['false'])[0] == 'true':
+                return self._content(pid, dsid)
+            return self._send(200, repository.datastream_info(pid, dsid))
+        return self._send(404, {'message': 'Not found'})
+
+    def _content(self, pid, dsid):
+        repository = self.repository
+        size = repository.datastream_size
+        start = 0
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            if start >= size:
+                return self._send(416)
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, size - 1, size))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(size - start))
+        self.end_headers()
+        block = repository.block
+        position = start
+        while position < size:
+            offset = position % len(block)
+            piece = block[offset:offset + min(len(block) - offset, size - position)]
+            self.wfile.write(piece)
+            position += len(piece)
+
+    def _solr(self, query, params):
+        repository = self.repository
+        rows = int(params.get('rows', ['10'])[0])
+        fields = params.get('fl', ['PID'])[0].split(',')
+        low, high = repository.solr_range(params.get('fq', []))
+        cursor = params.get('cursorMark', [None])[0]
+        if cursor is None:
+            start = low + int(params.get('start', ['0'])[0])
+        else:
+            start = low if cursor == '*' else int(cursor)
+        end = min(high, start + rows)
+        results = {
+            'responseHeader': {'status': 0, 'QTime': 1, 'params': dict((k, v[0]) for k, v in params.items())},
+            'response': {'numFound': high - low, 'start': start - low,
+                         'docs': [repository.solr_doc(index, fields) for index in range(start, end)]},
+        }
+        if cursor is not None:
+            results['nextCursorMark'] = str(end) if end > start else cursor
+        return self._send(200, results)
+
+    # v1ku/
+
+    def _v1ku(self, method, segments, params):
+        if segments[0] in ('regen', 'reindex'):
+            return self._send(200, {'message': 'ok'})
+        if segments[0] == 'object' and len(segments) > 2 and segments[2] == 'premis':
+            return self._send(200, self._premis(segments[1]), content_type='application/xml')
+        return self._send(404, {'message': 'Not found'})
+
+    def _premis(self, pid):
+        events = ''.join(
+            '<event><eventIdentifier><eventIdentifierType>UUID</eventIdentifierType>'
+            '<eventIdentifierValue>{pid}-{n}</eventIdentifierValue></eventIdentifier>'
+            '<eventType>fixity check</eventType><eventDateTime>2019-01-0{d}T00:00:00Z</eventDateTime>'
+            '<eventDetail>MD5 checksum validated</eventDetail>'
+            '<eventOutcomeInformation><eventOutcome>SHA-1 checksum validated.</eventOutcome></eventOutcomeInformation>'
+            '<linkingObjectIdentifier><linkingObjectIdentifierType>FEDORA-URI</linkingObjectIdentifierType>'
+            '<linkingObjectIdentifierValue>info:fedora/{pid}/OBJ</linkingObjectIdentifierValue>'
+            '</linkingObjectIdentifier></event>'.format(pid=pid, n=n, d=n % 9 + 1) for n in range(20))
+        return ('<?xml version="1.0"?><premis xmlns="info:lc/xmlns/premis-v2" version="2.0">'
+                '<object><objectIdentifier><objectIdentifierType>FEDORA-URI</objectIdentifierType>'
+                '<objectIdentifierValue>info:fedora/{pid}/OBJ</objectIdentifierValue></objectIdentifier>'
+                '<objectCharacteristics><compositionLevel>0</compositionLevel><fixity>'
+                '<messageDigestAlgorithm>MD5</messageDigestAlgorithm><messageDigest>{checksum}</messageDigest>'
+                '</fixity><size>{size}</size></objectCharacteristics></object>{events}</premis>').format(
+            pid=pid, checksum=self.repository.checksum, size=self.repository.datastream_size,
+            events=events).encode('utf-8')
+
+
+def start(host='127.0.0.1', port=0, **settings):
+    """
+    Runs a mock server in a background thread.
+
+    :param settings: MockRepository settings (docs, datastream_size, latency, error_rate...)
+    :return: (server, rest_url) - call server.shutdown() when done
+    """
+    handler = type('Handler', (MockHandler,), {'repository': MockRepository(**settings)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://{}:{}{}'.format(host, server.server_address[1], PREFIX)
+
+
+def start_process(host='127.0.0.1', port=0, **settings):
+    """
+    Runs a mock server in a separate process, so it doesn't share the client's CPU (GIL) or show up in
+    its memory measurements.
+
+    :param settings: MockRepository settings, as for start() - given as command line options
+    :return: (process, rest_url) - call process.terminate() when done
+    """
+    command = [sys.executable, os.path.abspath(__file__), '--host', host, '--port', str(port)]
+    for name, value in settings.items():
+        command += ['--' + name.replace('_', '-'), str(value)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, universal_newlines=True)
+    line = process.stdout.readline()
+    if not line.startswith('Mock Islandora REST at '):
+        process.kill()
+        raise Exception("Mock server didn't start: {!r}".format(line))
+    return process, line.strip()[len('Mock Islandora REST at '):]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stand-in Islandora REST server for benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--docs', type=int, default=10000, help='Solr documents')
+    parser.add_argument('--datastream-size', type=int, default=1048576, help='bytes per datastream')
+    parser.add_argument('--field-size', type=int, default=64, help='characters per made-up Solr field')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many more seconds, at random')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=503)
+    args = parser.parse_args()
+    server, rest_url = start(args.host, args.port, docs=args.docs, datastream_size=args.datastream_size,
+                             field_size=args.field_size, latency=args.latency, jitter=args.jitter,
+                             error_rate=args.error_rate, error_status=args.error_status)
+    # start_process reads this line for the URL
+    print("Mock Islandora REST at {}".format(rest_url), flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
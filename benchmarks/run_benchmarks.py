@@ -0,0 +1,198 @@
+# run_benchmarks.py
+# islandora7_rest benchmarks
+# Copyright (c) 2019 The University of Kansas
+#
+# Throughput, latency and memory of the client against the local mock server (mock_server.py).
+# No Islandora needed.
+#
+# Usage:
+# python benchmarks/run_benchmarks.py [--latency 0.005] [--error-rate 0.01] [--only solr] [--json results.json]
+#
+# For each scenario: wall time, requests/sec, p50/p99 request latency, and peak Python memory
+# (tracemalloc - which slows things down a bit; --no-memory to skip it).  The mock server runs in a
+# process of its own, so the memory is the client's alone.
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_server
+from islandora7_rest import IslandoraClient
+from islandora7_rest.ku import IslandoraClientKU
+from islandora7_rest.metrics import Metrics
+from islandora7_rest.retry import RetryPolicy
+
+MODEL_NS = 'info:fedora/fedora-system:def/model#'
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+# Scenarios: each gets the clients and settings, does its thing, and returns how many items it handled
+
+def solr_generator(client, ku_client, args):
+    return sum(1 for _ in client.solr_generator("*:*", fl="PID,fgs_label_s,mods_title_ms"))
+
+
+def solr_generator_prefetch(client, ku_client, args):
+    return sum(1 for _ in client.solr_generator("*:*", fl="PID,fgs_label_s,mods_title_ms", prefetch=2))
+
+
+def solr_generator_streaming(client, ku_client, args):
+    return sum(1 for _ in client.solr_generator("*:*", fl="PID,fgs_label_s,mods_title_ms", rows=5000,
+                                                streaming=True))
+
+
+def solr_generator_big_pages(client, ku_client, args):
+    # The same as above without streaming, for the memory comparison
+    return sum(1 for _ in client.solr_generator("*:*", fl="PID,fgs_label_s,mods_title_ms", rows=5000))
+
+
+def solr_sharded(client, ku_client, args):
+    boundaries = [mock_server.MockRepository.pid(args.docs * n // 4) for n in range(1, 4)]
+    shards = client.pid_range_shards(boundaries)
+    return sum(1 for _ in client.solr_sharded_generator("*:*", shards=shards, fl="PID,fgs_label_s,mods_title_ms"))
+
+
+def _pids(args):
+    return [mock_server.MockRepository.pid(n) for n in range(args.objects)]
+
+
+def get_object_serial(client, ku_client, args):
+    for pid in _pids(args):
+        client.get_object(pid)
+    return args.objects
+
+
+def get_objects_batch(client, ku_client, args):
+    return sum(1 for result in client.get_objects(_pids(args)) if result.ok)
+
+
+def relationship_shortcuts(client, ku_client, args):
+    for pid in _pids(args):
+        client.add_content_model(pid, 'islandora:sp_basic_image')
+        client.add_collection_membership(pid, 'bench:collection')
+    return args.objects
+
+
+def reconcile_bulk(client, ku_client, args):
+    items = ((pid, [(MODEL_NS, 'hasModel', 'islandora:sp_large_image_cmodel')]) for pid in _pids(args))
+    return sum(1 for result in client.reconcile_relationships_bulk(items, solr_prefetch=True) if result.ok)
+
+
+def datastream_download(client, ku_client, args):
+    count = max(1, args.objects // 10)
+    with tempfile.TemporaryDirectory() as directory:
+        for n, pid in enumerate(_pids(args)[:count]):
+            client.download_datastream(pid, 'OBJ', os.path.join(directory, str(n)))
+    return count
+
+
+def datastream_upload(client, ku_client, args):
+    count = max(1, args.objects // 10)
+    with tempfile.NamedTemporaryFile() as upload:
+        block = os.urandom(1048576)
+        for _ in range(max(1, args.datastream_size // len(block))):
+            upload.write(block)
+        upload.flush()
+        for pid in _pids(args)[:count]:
+            client.create_datastream(pid, 'OBJ', file=upload.name, mimeType='application/octet-stream')
+    return count
+
+
+def ku_regen(client, ku_client, args):
+    for pid in _pids(args):
+        ku_client.regen(pid, 'DC')
+    return args.objects
+
+
+def ku_reindex(client, ku_client, args):
+    for pid in _pids(args):
+        ku_client.reindex(pid)
+    return args.objects
+
+
+SCENARIOS = [
+    solr_generator, solr_generator_prefetch, solr_generator_streaming, solr_generator_big_pages, solr_sharded,
+    get_object_serial, get_objects_batch, relationship_shortcuts, reconcile_bulk,
+    datastream_download, datastream_upload, ku_regen, ku_reindex,
+]
+
+
+def run(scenario, rest_url, args):
+    metrics = Metrics()
+    latencies = []
+    metrics.after_request.append(lambda method, endpoint, response, seconds, error: latencies.append(seconds))
+    retry = RetryPolicy(total=10, backoff_factor=0.01) if args.error_rate else None
+    client = IslandoraClient(rest_url, 'bench', 'bench', max_workers=args.workers, metrics=metrics, retry=retry)
+    ku_client = IslandoraClientKU(rest_url, 'bench', 'bench', max_workers=args.workers, metrics=metrics,
+                                  retry=retry)
+    if args.memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    items = scenario(client, ku_client, args)
+    elapsed = time.perf_counter() - started
+    peak = 0
+    if args.memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    client.close()
+    ku_client.close()
+    requests = sum(endpoint['requests'] for endpoint in metrics.snapshot()['endpoints'].values())
+    return {
+        'scenario': scenario.__name__,
+        'items': items,
+        'seconds': elapsed,
+        'requests': requests,
+        'requests_per_second': requests / elapsed if elapsed else 0.0,
+        'items_per_second': items / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'peak_memory_mb': peak / 1048576.0,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='islandora7_rest benchmarks against a mock server')
+    parser.add_argument('--docs', type=int, default=20000, help='Solr documents')
+    parser.add_argument('--objects', type=int, default=200, help='objects for the per-object scenarios')
+    parser.add_argument('--datastream-size', type=int, default=8388608, help='bytes per datastream')
+    parser.add_argument('--latency', type=float, default=0.005, help='server-side seconds per request')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--only', action='append', help='run scenarios whose names contain this (repeatable)')
+    parser.add_argument('--no-memory', dest='memory', action='store_false')
+    parser.add_argument('--json', help='also write the results here')
+    args = parser.parse_args()
+
+    server, rest_url = mock_server.start_process(docs=args.docs, datastream_size=args.datastream_size,
+                                                 latency=args.latency, jitter=args.jitter,
+                                                 error_rate=args.error_rate)
+    results = []
+    print("{:<28} {:>8} {:>9} {:>10} {:>9} {:>9} {:>10}".format(
+        'scenario', 'items', 'seconds', 'req/s', 'p50 ms', 'p99 ms', 'peak MB'))
+    try:
+        for scenario in SCENARIOS:
+            if args.only and not any(name in scenario.__name__ for name in args.only):
+                continue
+            result = run(scenario, rest_url, args)
+            results.append(result)
+            print("{scenario:<28} {items:>8} {seconds:>9.2f} {requests_per_second:>10.1f} "
+                  "{p50_ms:>9.2f} {p99_ms:>9.2f} {peak_memory_mb:>10.1f}".format(**result))
+    finally:
+        server.terminate()
+        server.wait()
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'settings': vars(args), 'results': results}, output, indent=2)
@@ -0,0 +1,447 @@
+# /islandora7_rest/AsyncIslandoraClient.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+# http://www.ku.edu
+#
+# asyncio flavor of IslandoraClient, same endpoints and method names - just await them.
+# Needs aiohttp:  pip install islandora7-rest[async]
+#
+# Concurrency is bounded twice:
+#   limit / limit_per_host   - the aiohttp connection pool
+#   concurrency              - a semaphore per host, so hundreds of coroutines can be
+#                              queued up without hammering Drupal with all of them at once
+
+import asyncio
+import json
+
+from urllib.parse import quote_plus, urlsplit
+
+from .results import DatastreamInfo, ObjectProfile, Relationship, solr_doc
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+def _query_params(params):
+    """
+    requests is forgiving about GET params (drops None, repeats lists), aiohttp isn't.
+
+    :param params: dictionary of GET params
+    :return: list of (key, value) string tuples
+    """
+    if not params:
+        return None
+    query = []
+    for key, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            query.extend((key, str(v)) for v in value)
+        else:
+            query.append((key, str(value)))
+    return query
+
+
+class AsyncIslandoraClient(object):
+
+    def __init__(self, rest_url=None, user=None, token=None, limit=100, limit_per_host=0, concurrency=32):
+        """
+
+        :param rest_url: URL to Islandora Rest, not including the v1/
+        :param user: Islandora user
+        :param token: Token/Password
+        :param limit: total connections in the pool (0 is unlimited)
+        :param limit_per_host: connections per host in the pool (0 is unlimited)
+        :param concurrency: requests in flight per host
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncIslandoraClient needs aiohttp: pip install islandora7-rest[async]")
+        self.url_base = rest_url
+        if self.url_base[-1] != "/":
+            self.url_base = rest_url + "/"
+        self.auth = None
+        if user and token:
+            self.auth = (user, token)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.concurrency = concurrency
+        self._session = None
+        self._semaphores = {}
+
+    # aiohttp wants its session (and semaphores) made inside a running loop,
+    # so we build them on first use rather than in __init__
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def _semaphore(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.concurrency)
+        return self._semaphores[host]
+
+    def _basic_auth(self):
+        # Allow client.auth = (user, token), same as the requests-based client
+        if isinstance(self.auth, tuple):
+            return aiohttp.BasicAuth(*self.auth)
+        return self.auth
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def request(self, method, url, **kwargs):
+        """
+        The body is read before the per-host semaphore is released, so the returned
+        response can be .json()'d or .read() afterwards without holding a connection.
+        """
+        modified_url = self.url_base + 'v1/' + url
+        if 'params' in kwargs:
+            kwargs['params'] = _query_params(kwargs['params'])
+        async with self._semaphore(modified_url):
+            response = await self.session.request(method, modified_url, auth=self._basic_auth(), **kwargs)
+            await response.read()
+        return response
+
+    async def _stream(self, method, url, chunk_size, **kwargs):
+        # The semaphore (and connection) are held for as long as the caller iterates
+        modified_url = self.url_base + 'v1/' + url
+        if 'params' in kwargs:
+            kwargs['params'] = _query_params(kwargs['params'])
+        async with self._semaphore(modified_url):
+            async with self.session.request(method, modified_url, auth=self._basic_auth(), **kwargs) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    yield chunk
+
+    # Objects:
+    # GET       /islandora/rest/v1/object/{pid}    GET existing object
+    # POST      /islandora/rest/v1/object          UPDATE existing object
+    # PUT       /islandora/rest/v1/object/{pid}    CREATE new object
+    # DELETE    /islandora/rest/v1/object/{pid}    DELETE existing obj
+
+    async def get_object(self, pid, typed=False):
+        url = "object/{}".format(pid)
+        response = await self.request('GET', url)
+        response.raise_for_status()
+        profile = await response.json(content_type=None)
+        return ObjectProfile.from_dict(profile) if typed else profile
+
+    async def update_object(self, pid, **changed_object_as_kwargs):
+        """
+
+        :param pid:
+        :param changed_object_as_kwargs: arguments likely to be label, owner, or state
+        :return:
+        """
+        url = "object/{}".format(pid)
+        response = await self.request('PUT', url, json=changed_object_as_kwargs)
+        response.raise_for_status()
+        return await response.json(content_type=None)
+
+    async def create_object(self, **new_object_as_kwargs):
+        """
+
+        :param new_object_as_kwargs: This is a passthrough dictionary to the POST data \
+            meaning, you can say pid="namespace:5", namespace="namespace", label="Label", etc
+        :return:
+        """
+        url = "object"
+        response = await self.request('POST', url, data=new_object_as_kwargs)
+        response.raise_for_status()
+        return await response.json(content_type=None)
+
+    async def delete_object(self, pid):
+        if not pid:
+            raise Exception("Missing PID")
+        url = "object/{}".format(pid)
+        response = await self.request('DELETE', url)
+        response.raise_for_status()
+        return response
+
+    # GET       /islandora/rest/v1/solr/{query}        SEARCH for objects.
+    # Raw response document as a Python dictionary structure
+
+    async def solr_query(self, query="*:*", **params):
+        url = "solr/{}".format(quote_plus(query))
+        response = await self.request('GET', url, params=params)
+        response.raise_for_status()
+        return await response.json(content_type=None)
+
+    # Async generator for documents from a Solr query:
+    #   async for doc in client.solr_generator("PID:*"):
+    # Same cursor logic and defaults as IslandoraClient.solr_generator
+
+    async def solr_generator(self, query="*:*", typed=False, **params):
+        """
+
+        :param query:
+        :param typed: yield results.SolrDoc objects instead of dictionaries
+        :param params:
+        """
+        if 'start' in params.keys():
+            del params['start']
+        if 'rows' not in params.keys():
+            params['rows'] = 100
+        if 'sort' not in params.keys():
+            params['sort'] = "PID asc"
+        if 'fl' not in params.keys():
+            params['fl'] = "PID"
+        params['cursorMark'] = '*'
+
+        while True:
+            results = await self.solr_query(query, **params)
+            nextCursorMark = results['nextCursorMark']
+            for result in results['response']['docs']:
+                yield solr_doc(result) if typed else result
+            # We're done here
+            if nextCursorMark == params['cursorMark']:
+                break
+            params['cursorMark'] = nextCursorMark
+
+    # Relationships:
+    # GET       /islandora/rest/v1/object/{pid}/relationship?{params}   LIST existing relationships
+    # POST      /islandora/rest/v1/object/{pid}/relationship            ADD a new relationship
+    # DELETE    /islandora/rest/v1/object/{pid}/relationship            REMOVE an existing relationship
+
+    async def get_relationships(self, pid, typed=False, **kwargs):
+        """
+        :param pid:
+        :param typed: return a list of results.Relationship instead of dictionaries
+        :param kwargs: predicate, uri, object, literal... passed as GET params
+        :return: list of dictionary objects
+        """
+        if not pid:
+            raise Exception("Missing PID")
+        response = await self.request('GET', "object/{}/relationship".format(pid), params=kwargs)
+        response.raise_for_status()
+        relationships = await response.json(content_type=None)
+        return [Relationship.from_dict(relationship) for relationship in relationships] if typed else relationships
+
+    async def add_relationship(self, pid, ns, predicate, object, type='uri'):
+        if not pid:
+            raise Exception("Missing PID")
+        response = await self.request('POST', "object/{}/relationship".format(pid), data={
+            "uri": ns,
+            "predicate": predicate,
+            "object": object,
+            "type": type
+        })
+        response.raise_for_status()
+        return response
+
+    async def remove_relationship(self, pid, predicate, object=None, ns=None, literal=False):
+        if not pid:
+            raise Exception("Missing PID")
+        json_data = {}
+        if predicate: json_data["predicate"] = predicate
+        if ns: json_data["uri"] = ns
+        if object: json_data["object"] = object
+        json_data["literal"] = 1 if literal else 0
+
+        response = await self.request('DELETE', "object/{}/relationship".format(pid), json=json_data)
+        response.raise_for_status()
+        return response
+
+    async def add_content_model(self, pid, cmodel, exclusive=False):
+        """
+        Convenience function for cModel relationships.
+        With exclusive, other cModels are removed - one at a time, since each change rewrites RELS-EXT
+        and two at once can lose one of them.
+
+        :param pid:
+        :param cmodel:
+        """
+        i_know = False
+        current_rels = await self.get_relationships(pid, predicate='hasModel',
+                                                    uri="info:fedora/fedora-system:def/model#")
+
+        for model_rel in current_rels:
+            if model_rel['object']['value'] == cmodel:
+                i_know = True
+            elif exclusive:
+                await self.remove_relationship(pid, predicate='hasModel', ns="info:fedora/fedora-system:def/model#",
+                                               object=model_rel['object']['value'])
+        if not i_know:
+            await self.add_relationship(pid,
+                                        object=cmodel,
+                                        predicate='hasModel',
+                                        ns='info:fedora/fedora-system:def/model#')
+
+    async def add_collection_membership(self, pid, parent_pid):
+        """
+        Convenience function for isMemberOfCollection relationships
+
+        :param pid:
+        :param parent_pid:
+        """
+        existing_collections = await self.get_relationships(pid,
+                                                            uri="info:fedora/fedora-system:def/relations-external#",
+                                                            predicate='isMemberOfCollection')
+        for collection in existing_collections:
+            if collection['object']['value'] == parent_pid:
+                return
+        await self.add_relationship(pid, object=parent_pid, predicate='isMemberOfCollection',
+                                    ns='info:fedora/fedora-system:def/relations-external#')
+
+    async def remove_collection_membership(self, pid, parent_pid_to_remove):
+        await self.remove_relationship(pid, predicate='isMemberOfCollection',
+                                       ns='info:fedora/fedora-system:def/relations-external#',
+                                       object=parent_pid_to_remove)
+
+    # Datastreams:
+    # GET       /islandora/rest/v1/object/{pid}/datastream/{dsid}       GET a datastream for an object
+    # POST      /islandora/rest/v1/object/{pid}/datastream/             CREATE a datastream on object
+    # PUT       /islandora/rest/v1/object/{pid}/datastream/{dsid}       UPDATE an existing datastream
+    # DELETE    /islandora/rest/v1/object/{pid}/datastream/{dsid}       DELETE an existing datastream
+
+    async def get_datastream(self, pid, dsid, version=None, streaming=False, streaming_size=4096):
+        """
+        With streaming=True this returns an async iterator of byte blocks:
+            async for block in await client.get_datastream(pid, 'OBJ', streaming=True):
+        HTTP errors surface on the first block rather than on the call.
+        """
+        if not pid:
+            raise Exception("Missing PID")
+        if not dsid:
+            raise Exception("Missing DSID")
+        params = {
+            "content": "true",
+            "version": version
+        }
+        url = "object/{}/datastream/{}".format(pid, dsid)
+        if streaming:
+            return self._stream('GET', url, streaming_size, params=params)
+        response = await self.request('GET', url, params=params)
+        response.raise_for_status()
+        return await response.read()
+
+    async def get_datastream_info(self, pid, dsid, version=None, typed=False):
+        if not pid:
+            raise Exception("Missing PID")
+        if not dsid:
+            raise Exception("Missing DSID")
+        params = {
+            "content": "false",
+            "version": version
+        }
+        url = "object/{}/datastream/{}".format(pid, dsid)
+        response = await self.request('GET', url, params=params)
+        response.raise_for_status()
+        info = await response.json(content_type=None)
+        return DatastreamInfo.from_dict(info) if typed else info
+
+    @staticmethod
+    def _form(metadata, file_handle=None, string=None, filename=None):
+        # Multipart fields have to be strings for aiohttp
+        form = aiohttp.FormData()
+        for key, value in metadata.items():
+            form.add_field(key, str(value))
+        if file_handle is not None:
+            form.add_field("file", file_handle)
+        elif string is not None:
+            form.add_field("file", string, filename=filename)
+        return form
+
+    async def create_datastream(self, pid, dsid, *, file=None, string=None, versionable=True, **metadata_as_kwargs):
+        """
+
+        :param pid:
+        :param dsid:
+        :param file:
+        :param versionable: set with a Python boolean
+        :param string:
+        :param metadata_as_kwargs: Passthrough to the form data
+            possible - label, state, mimeType, checksumType, controlGroup
+        :return:
+        """
+        if not pid:
+            raise Exception("Missing PID on create_datastream")
+        if not dsid:
+            raise Exception("Missing DSID on create_datastream")
+        if file is None and string is None:
+            raise Exception("Missing argument. Either file or string is required.")
+
+        metadata_as_kwargs['dsid'] = dsid
+        metadata_as_kwargs['versionable'] = 1 if versionable else 0
+        if 'checksumType' not in metadata_as_kwargs:
+            metadata_as_kwargs['checksumType'] = "MD5"
+
+        url = "object/{}/datastream".format(pid)
+
+        if file is not None:
+            with open(file, 'rb') as file_handle:
+                response = await self.request('POST', url, data=self._form(metadata_as_kwargs, file_handle))
+        else:
+            if 'mimetype' not in metadata_as_kwargs:
+                metadata_as_kwargs['mimeType'] = 'application/xml'
+            response = await self.request('POST', url, data=self._form(metadata_as_kwargs, string=string,
+                                                                       filename='{} data'.format(dsid)))
+        response.raise_for_status()
+        try:
+            return await response.json(content_type=None)
+        except json.JSONDecodeError as json_error:
+            # Same large-upload 201-with-no-JSON quirk as the sync client
+            if response.status == 201:
+                return dict()
+            else:
+                raise json_error
+
+    async def update_datastream(self, pid, dsid, *, file=None, string=None, versionable=None, **metadata_as_kwargs):
+        """
+
+        :param pid:
+        :param dsid:
+        :param versionable: Set with a Python boolean
+        :param file: optional - String representation of a file to transmit
+        :param string: optional - Direct string as a file (i.e., an XML dumps())
+        :param metadata_as_kwargs: Passthrough to the form data
+            possible - label, state, mimeType, checksumType (can't change the controlGroup)
+        :return:
+        """
+        if not pid:
+            raise Exception("Missing PID")
+        if not dsid:
+            raise Exception("Missing DSID")
+        url = "object/{}/datastream/{}".format(pid, dsid)
+
+        if versionable is not None:
+            metadata_as_kwargs['versionable'] = 1 if versionable else 0
+        # POST and say we're PUTting, see IslandoraClient.update_datastream
+        metadata_as_kwargs['method'] = "PUT"
+
+        if file is not None:
+            with open(file, 'rb') as file_handle:
+                response = await self.request('POST', url, data=self._form(metadata_as_kwargs, file_handle))
+        elif string is not None:
+            if 'mimeType' not in metadata_as_kwargs:
+                metadata_as_kwargs['mimeType'] = 'application/xml'
+            response = await self.request('POST', url, data=self._form(metadata_as_kwargs, string=string,
+                                                                       filename='{} data'.format(dsid)))
+        else:
+            response = await self.request('POST', url, data=metadata_as_kwargs)
+        response.raise_for_status()
+        return response
+
+    async def delete_datastream(self, pid, dsid):
+        if not pid:
+            raise Exception("Missing PID")
+        if not dsid:
+            raise Exception("Missing DSID")
+        url = "object/{}/datastream/{}".format(pid, dsid)
+        response = await self.request('DELETE', url)
+        response.raise_for_status()
+        return response
@@ -0,0 +1,254 @@
+# /islandora7_rest/BulkPurge.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Taking down a whole collection tree - test ingests, withdrawn collections - members first.
+#
+#   purge = BulkPurge(client, journal="purge-journal.jsonl", max_workers=16)
+#   plan = purge.plan(root="ku:test-collection")      # or query='PID:test\\:*'
+#   plan.write("purge-plan.json")                     # the dry run: look before you leap
+#   for batch_result in purge.purge(plan): ...
+#
+# The tree comes from Solr's RELS_EXT membership fields (isMemberOfCollection, isMemberOf,
+# isConstituentOf), a level at a time - or from a RelationshipIndex if you have one.
+# Objects are grouped by height: leaves first, then whatever only had leaves under it, and so on,
+# so a parent is never deleted while a member is still there.  Within a level, max_workers at once.
+# A member that fails to go keeps everything above it.
+#
+# keep_shared: an object that's also a member of something outside the tree is left alone
+# (with everything under it), rather than deleted out from under the other collection.
+# Its parents in the tree still go - it isn't orphaned, it has the other one.
+#
+# islandora_rest's DELETE purges from Fedora - there's no undo.
+
+import json
+
+from .RelationshipIndex import MEMBERSHIP, _strip
+from .concurrency import BatchResult, imap_unordered
+from .journal import Journal
+
+
+class PurgePlan(object):
+
+    def __init__(self, levels, kept=None, members=None):
+        """
+
+        :param levels: lists of PIDs, to be deleted in this order (leaves first)
+        :param kept: {pid: reason} for objects in the tree that won't be deleted
+        :param members: {pid: [its members in the plan]} - so a failed member holds its parents back
+        """
+        self.levels = levels
+        self.kept = kept or {}
+        self.members = members or {}
+
+    def __len__(self):
+        return sum(len(level) for level in self.levels)
+
+    def __iter__(self):
+        for level in self.levels:
+            yield from level
+
+    def to_dict(self):
+        return {'objects': len(self), 'levels': self.levels, 'kept': self.kept, 'members': self.members}
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as plan:
+            json.dump(self.to_dict(), plan, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as plan:
+            data = json.load(plan)
+        return cls(data['levels'], data.get('kept'), data.get('members'))
+
+
+class BulkPurge(object):
+
+    def __init__(self, client, journal=None, max_workers=None, predicates=MEMBERSHIP, index=None, keep_shared=True,
+                 chunk_size=100):
+        """
+
+        :param client: IslandoraClient
+        :param journal: path to a progress journal (optional) - PIDs already purged are skipped on a rerun
+        :param max_workers: deletes at once within a level, defaults to the client's max_workers
+        :param predicates: membership predicates that make up the tree
+        :param index: a RelationshipIndex to read the tree from, instead of Solr
+        :param keep_shared: leave objects that are also members of something outside the tree
+        :param chunk_size: parents per Solr query while walking the tree
+        """
+        self.client = client
+        self.journal = Journal(journal) if journal else None
+        self.max_workers = max_workers or client.max_workers
+        self.predicates = tuple(predicates)
+        self.index = index
+        self.keep_shared = keep_shared
+        self.chunk_size = chunk_size
+
+    # Finding the tree
+
+    def _fields(self):
+        return ['RELS_EXT_{}_uri_ms'.format(predicate) for predicate in self.predicates]
+
+    def _parents(self, doc):
+        return set(_strip(value) for field in self._fields() for value in doc.get(field, ()))
+
+    def _solr_docs(self, query):
+        fl = ','.join(['PID'] + self._fields())
+        return list(self.client.solr_generator(query, fl=fl, rows=1000))
+
+    def _children(self, field, parents):
+        return self._solr_docs(self.client._terms_query(field, ['info:fedora/' + pid for pid in parents]))
+
+    def _walk(self, roots):
+        # {pid: set of parents} for everything at or below the roots
+        parents = {}
+        if self.index is not None:
+            frontier = list(roots)
+            for pid in frontier:
+                parents[pid] = set(self.index.parents(pid, self.predicates))
+            while frontier:
+                found = []
+                for pid in frontier:
+                    for child in self.index.children(pid, self.predicates):
+                        if child not in parents:
+                            parents[child] = set(self.index.parents(child, self.predicates))
+                            found.append(child)
+                frontier = found
+            return parents
+
+        for chunk in self.client._chunks(roots, self.chunk_size):
+            docs = dict((doc['PID'], doc) for doc in self._solr_docs(self.client._terms_query('PID', chunk)))
+            for pid in chunk:
+                parents[pid] = self._parents(docs.get(pid, {}))
+        frontier = list(roots)
+        while frontier:
+            # One Solr walk per membership field and chunk of the level, several at once
+            found = []
+            queries = ((field, chunk) for chunk in self.client._chunks(frontier, self.chunk_size)
+                       for field in self._fields())
+            for batch_result in imap_unordered(lambda query: self._children(*query), queries, self.max_workers):
+                if not batch_result.ok:
+                    raise batch_result.error
+                for doc in batch_result.result:
+                    if doc['PID'] not in parents:
+                        parents[doc['PID']] = self._parents(doc)
+                        found.append(doc['PID'])
+            frontier = found
+        return parents
+
+    def plan(self, root=None, query=None):
+        """
+        What purge() would delete, in order - nothing is changed.
+
+        :param root: PID at the top of the tree (deleted too)
+        :param query: or a Solr query - everything it finds, and everything under those
+        :return: PurgePlan
+        """
+        if root is None and query is None:
+            raise Exception("Missing root or query")
+        roots = [root] if root else [doc['PID'] for doc in self.client.solr_generator(query, fl='PID', rows=1000)]
+        parents = self._walk(roots)
+        roots = set(roots)
+
+        kept = {}
+        if self.keep_shared:
+            changed = True
+            while changed:
+                changed = False
+                for pid, its_parents in parents.items():
+                    if pid in roots or pid in kept:
+                        continue
+                    outside = [parent for parent in its_parents if parent not in parents]
+                    if outside:
+                        kept[pid] = 'also a member of {}'.format(', '.join(sorted(outside)))
+                        changed = True
+                    else:
+                        under_kept = [parent for parent in its_parents if parent in kept]
+                        if under_kept:
+                            kept[pid] = 'under {}'.format(', '.join(sorted(under_kept)))
+                            changed = True
+
+        children = dict((pid, []) for pid in parents)
+        for pid, its_parents in parents.items():
+            for parent in its_parents:
+                if parent in children and parent != pid:
+                    children[parent].append(pid)
+        heights = self._heights(children)
+        levels = []
+        for pid, height in heights.items():
+            if pid in kept:
+                continue
+            while len(levels) <= height:
+                levels.append([])
+            levels[height].append(pid)
+        members = dict((pid, sorted(child for child in children[pid] if child not in kept))
+                       for pid in heights if pid not in kept and children[pid])
+        return PurgePlan([sorted(level) for level in levels if level], kept, members)
+
+    @staticmethod
+    def _heights(children):
+        # Leaves are 0, anything else one more than its tallest member.  Without recursion (trees get deep),
+        # and a membership cycle is cut where it's found
+        heights = {}
+        for start in children:
+            if start in heights:
+                continue
+            stack = [(start, iter(children[start]))]
+            visiting = {start}
+            while stack:
+                pid, members = stack[-1]
+                member = next(members, None)
+                if member is None:
+                    stack.pop()
+                    visiting.discard(pid)
+                    heights[pid] = max([heights[child] + 1 for child in children[pid] if child in heights] or [0])
+                elif member not in heights and member not in visiting:
+                    visiting.add(member)
+                    stack.append((member, iter(children[member])))
+        return heights
+
+    # Deleting
+
+    def _delete(self, pid):
+        try:
+            self.client.delete_object(pid)
+        except Exception as error:
+            # Gone already - deleted by an earlier run that didn't get to write it down
+            if getattr(getattr(error, 'response', None), 'status_code', None) == 404:
+                return 'gone'
+            raise
+        return 'deleted'
+
+    def purge(self, plan):
+        """
+        Deletes the plan, a level at a time.
+
+        :param plan: from plan() (or PurgePlan.load of a written one)
+        :return: generator of BatchResult, item is the PID and result 'deleted' or 'gone' (already was)
+        """
+        failed = set()
+        for level in plan.levels:
+            pending = []
+            for pid in level:
+                if self.journal and self.journal.is_done('purge ' + pid):
+                    continue
+                blocked = [child for child in plan.members.get(pid, ()) if child in failed]
+                if blocked:
+                    failed.add(pid)
+                    yield BatchResult(pid, None, Exception("Not purged: member {} is still there".format(blocked[0])))
+                else:
+                    pending.append(pid)
+            for batch_result in imap_unordered(self._delete, pending, self.max_workers):
+                pid = batch_result.item
+                if batch_result.ok:
+                    if self.journal:
+                        self.journal.record('purge ' + pid, pid=pid)
+                else:
+                    failed.add(pid)
+                    if self.journal:
+                        self.journal.record('purge ' + pid, 'failed', pid=pid, error=str(batch_result.error))
+                yield batch_result
+
+    def close(self):
+        if self.journal:
+            self.journal.close()
@@ -0,0 +1,157 @@
+# /islandora7_rest/DatastreamInventory.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Datastream metadata for a whole collection - sizes, MIME types, dates, checksums - from Solr
+# in one cursor walk, instead of a get_datastream_info call per (pid, dsid).
+#
+# Islandora's Solr config indexes each datastream's latest version as
+# fedora_datastream_latest_{DSID}_{ATTRIBUTE}_ms (SIZE, MIMETYPE, CREATED, LABEL...), and the list of
+# DSIDs as fedora_datastreams_ms.  Whatever Solr hasn't got (checksums usually) is filled in with
+# concurrent get_datastream_info calls, for just the datastreams that need it.  Those that fail are
+# listed in inventory.errors, so "unknown" and "couldn't fetch" can be told apart.
+#
+# Results are kept as columns - one list per field, sizes in an array - rather than a dictionary
+# per datastream: millions of rows fit, and they hand straight over to pandas or pyarrow
+# (pip install islandora7-rest[pandas] / [arrow]).
+
+import sys
+
+from array import array
+
+from .concurrency import imap_unordered
+
+# get_datastream_info key: Solr attribute
+SOLR_ATTRIBUTES = {
+    'size': 'SIZE',
+    'mimeType': 'MIMETYPE',
+    'created': 'CREATED',
+    'label': 'LABEL',
+    'state': 'STATE',
+    'controlGroup': 'CONTROL_GROUP',
+    'checksum': 'DIGEST',
+    'checksumType': 'DIGEST_TYPE',
+}
+FIELDS = ('size', 'mimeType', 'created', 'label')
+FIELD_PATTERN = 'fedora_datastream_latest_{dsid}_{attribute}_ms'
+
+
+class DatastreamInventory(object):
+
+    def __init__(self, fields=FIELDS):
+        """
+        An empty inventory - see from_solr()
+
+        :param fields: get_datastream_info keys kept for each datastream
+        """
+        self.fields = tuple(fields)
+        # (pid, dsid, exception) for every REST fallback that failed - those rows' fields weren't filled in
+        self.errors = []
+        self.columns = {'pid': [], 'dsid': []}
+        for field in self.fields:
+            # -1 for an unknown size
+            self.columns[field] = array('q') if field == 'size' else []
+
+    @classmethod
+    def from_solr(cls, client, query="*:*", dsids=None, fields=FIELDS, rest_fallback=True, max_workers=None,
+                  field_pattern=FIELD_PATTERN, rows=1000, **params):
+        """
+
+        :param client: IslandoraClient
+        :param query: Solr query for the objects
+        :param dsids: only these DSIDs (default all of them)
+        :param fields: get_datastream_info keys wanted - size, mimeType, created, label, state,
+            controlGroup, checksum, checksumType
+        :param rest_fallback: fetch fields Solr doesn't have with get_datastream_info (False leaves them None)
+        :param max_workers: for the fallback, defaults to the client's max_workers
+        :param field_pattern: Solr field name for a datastream attribute, if your index names them differently
+        :param rows: Solr page size
+        :param params: more Solr params (fq...)
+        :return: DatastreamInventory
+        """
+        inventory = cls(fields)
+        wanted = set(dsids) if dsids else None
+        solr_fields = dict((field, SOLR_ATTRIBUTES[field]) for field in inventory.fields)
+        fl = ['PID', 'fedora_datastreams_ms'] + [field_pattern.format(dsid='*', attribute=attribute)
+                                                 for attribute in solr_fields.values()]
+        missing = array('q')
+
+        for doc in client.solr_generator(query, fl=','.join(fl), rows=rows, **params):
+            pid = doc['PID']
+            for dsid in doc.get('fedora_datastreams_ms', []):
+                if wanted is not None and dsid not in wanted:
+                    continue
+                row = {}
+                for field, attribute in solr_fields.items():
+                    values = doc.get(field_pattern.format(dsid=dsid, attribute=attribute))
+                    if values:
+                        row[field] = values[0] if isinstance(values, list) else values
+                if len(row) < len(solr_fields):
+                    missing.append(len(inventory))
+                inventory._append(pid, dsid, row)
+
+        if rest_fallback and missing:
+            inventory._fill(client, missing, max_workers or client.max_workers)
+        return inventory
+
+    def _append(self, pid, dsid, row):
+        self.columns['pid'].append(pid)
+        self.columns['dsid'].append(sys.intern(dsid))
+        for field in self.fields:
+            value = row.get(field)
+            if field == 'size':
+                self.columns[field].append(int(value) if value not in (None, '') else -1)
+            elif field in ('mimeType', 'state', 'controlGroup', 'checksumType') and value is not None:
+                # A handful of distinct values across millions of rows - keep one copy of each
+                self.columns[field].append(sys.intern(str(value)))
+            else:
+                self.columns[field].append(value)
+
+    def _fill(self, client, indexes, max_workers):
+        pids, dsids = self.columns['pid'], self.columns['dsid']
+        results = imap_unordered(lambda index: client.get_datastream_info(pids[index], dsids[index]),
+                                 indexes, max_workers)
+        for batch_result in results:
+            index = batch_result.item
+            if not batch_result.ok:
+                self.errors.append((pids[index], dsids[index], batch_result.error))
+                continue
+            for field in self.fields:
+                value = batch_result.result.get(field)
+                if value is None:
+                    continue
+                if field == 'size':
+                    if self.columns[field][index] < 0:
+                        self.columns[field][index] = int(value)
+                elif self.columns[field][index] is None:
+                    self.columns[field][index] = value
+
+    def __len__(self):
+        return len(self.columns['pid'])
+
+    def rows(self):
+        """ Tuples of (pid, dsid, *fields), one per datastream """
+        return zip(*(self.columns[name] for name in self.names))
+
+    @property
+    def names(self):
+        return ('pid', 'dsid') + self.fields
+
+    def to_pandas(self):
+        # Imported here, not at the top - pandas takes longer to import than this whole package
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError("to_pandas needs pandas: pip install islandora7-rest[pandas]")
+        frame = pandas.DataFrame(dict((name, self.columns[name]) for name in self.names), columns=list(self.names))
+        for name in ('dsid', 'mimeType', 'state', 'controlGroup', 'checksumType'):
+            if name in frame:
+                frame[name] = frame[name].astype('category')
+        return frame
+
+    def to_arrow(self):
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("to_arrow needs pyarrow: pip install islandora7-rest[arrow]")
+        return pyarrow.table(dict((name, self.columns[name]) for name in self.names))
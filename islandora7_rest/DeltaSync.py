@@ -0,0 +1,153 @@
+# /islandora7_rest/DeltaSync.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# "What changed since last time?" from Solr, for keeping a downstream copy up to date
+# without re-exporting everything.
+#
+# The high-water mark is the time the previous walk started (less a safety margin for clock
+# skew and Solr commit lag), not the newest timestamp it saw: anything modified while a walk
+# is under way is then picked up by the next one.  Docs at or after the mark that were already
+# handed over are remembered with their timestamps, so they aren't repeated unless they change again.
+#
+# State is saved only once a walk finishes.  Stop part way and the next run starts from the
+# same place - you may see a change twice, but never miss one.
+
+import json
+import os
+
+from collections import namedtuple
+
+from .concurrency import imap_unordered
+from .timestamps import high_water_mark as walk_started, normalize
+
+
+class Change(namedtuple('Change', ['kind', 'pid', 'doc', 'datastreams'])):
+    """
+    kind is 'created', 'modified' or 'deleted' (Islandora's soft delete - state D).
+    datastreams is {dsid: get_datastream_info()} if asked for, otherwise None.
+    """
+    __slots__ = ()
+
+
+class DeltaSync(object):
+
+    def __init__(self, client, state, query="*:*", fl="PID", safety_margin=300,
+                 modified_field='fgs_lastModifiedDate', created_field='fgs_createdDate', state_field='fgs_state_s'):
+        """
+
+        :param client: IslandoraClient
+        :param state: JSON file holding the high-water mark between runs
+        :param query: Solr query for the objects you mirror
+        :param fl: fields you want in each change's doc (PID, timestamps and state are added)
+        :param safety_margin: seconds taken off the high-water mark, for clock skew and Solr commit lag
+        :param modified_field:
+        :param created_field:
+        :param state_field:
+        """
+        self.client = client
+        self.state_path = state
+        self.query = query
+        self.fl = fl
+        self.safety_margin = safety_margin
+        self.modified_field = modified_field
+        self.created_field = created_field
+        self.state_field = state_field
+        self.state = {'high_water_mark': None, 'seen': {}}
+        if os.path.exists(state):
+            with open(state, 'r', encoding='utf-8') as saved:
+                self.state = json.load(saved)
+
+    @property
+    def high_water_mark(self):
+        return self.state['high_water_mark']
+
+    def _save(self):
+        temporary = self.state_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as saved:
+            json.dump(self.state, saved)
+        os.replace(temporary, self.state_path)
+
+    def changes(self, datastreams=False, max_workers=None, rows=1000, **params):
+        """
+        Objects created, modified or (soft) deleted since the last run - everything, the first time.
+
+        :param datastreams: also fetch get_datastream_info for each changed object's datastreams,
+            several objects at a time (changes then come back in no particular order)
+        :param max_workers: for datastreams, defaults to the client's max_workers
+        :param rows: Solr page size
+        :param params: more Solr params (fq...)
+        :return: generator of Change
+        """
+        new_mark = walk_started(self.safety_margin)
+        high_water_mark = self.state['high_water_mark']
+        seen = self.state['seen']
+        new_seen = {}
+
+        fields = [field for field in self.fl.split(',') if field]
+        for field in ('PID', self.modified_field, self.created_field, self.state_field):
+            if field not in fields:
+                fields.append(field)
+        if datastreams and 'fedora_datastreams_ms' not in fields:
+            fields.append('fedora_datastreams_ms')
+        if high_water_mark:
+            fq = params.pop('fq', [])
+            if isinstance(fq, str):
+                fq = [fq]
+            params['fq'] = fq + ['{}:[{} TO *]'.format(self.modified_field, high_water_mark)]
+
+        def walk():
+            for doc in self.client.solr_generator(self.query, fl=','.join(fields), rows=rows, **params):
+                pid = doc['PID']
+                modified = normalize(doc.get(self.modified_field))
+                if modified and modified >= new_mark:
+                    new_seen[pid] = modified
+                if seen.get(pid) == modified:
+                    continue
+                if doc.get(self.state_field) in ('Deleted', 'D'):
+                    kind = 'deleted'
+                elif high_water_mark and normalize(doc.get(self.created_field) or '') < high_water_mark:
+                    kind = 'modified'
+                else:
+                    kind = 'created'
+                yield Change(kind, pid, doc, None)
+
+        if datastreams:
+            for batch_result in imap_unordered(self._with_datastreams, walk(),
+                                               max_workers or self.client.max_workers):
+                if not batch_result.ok:
+                    raise batch_result.error
+                yield batch_result.result
+        else:
+            yield from walk()
+
+        self.state = {'high_water_mark': new_mark, 'seen': new_seen}
+        self._save()
+
+    def _with_datastreams(self, change):
+        if change.kind == 'deleted':
+            return change
+        info = {}
+        for dsid in change.doc.get('fedora_datastreams_ms', []):
+            info[dsid] = self.client.get_datastream_info(change.pid, dsid)
+        return change._replace(datastreams=info)
+
+    def purged(self, pids, chunk_size=200, max_workers=None):
+        """
+        Objects purged outright don't show up as changes - they're just gone from Solr.
+        Give this the PIDs your copy has and it yields the ones Solr no longer knows.
+
+        :param pids: iterable of PIDs
+        :param chunk_size: PIDs checked per Solr query
+        :param max_workers: Solr queries at once, defaults to the client's max_workers
+        """
+        def missing(chunk):
+            query = self.client._terms_query('PID', chunk)
+            found = self.client.solr_query(query, fl='PID', rows=len(chunk))['response']['docs']
+            return set(chunk) - set(doc['PID'] for doc in found)
+
+        for batch_result in imap_unordered(missing, self.client._chunks(pids, chunk_size),
+                                           max_workers or self.client.max_workers):
+            if not batch_result.ok:
+                raise batch_result.error
+            yield from batch_result.result
@@ -0,0 +1,299 @@
+# /islandora7_rest/Exporter.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Whole objects out of the repository, for preservation copies and migrations.
+#
+# Each object becomes a bundle named after its PID (':' becomes '_'):
+#
+#   islandora_5/object.json          get_object - the profile, with every datastream's metadata
+#   islandora_5/relationships.json   get_relationships
+#   islandora_5/datastreams/OBJ.tif  content, one file per datastream (redirect/external ones are left out)
+#   islandora_5/manifest.json        {dsid: {file, checksum, checksumType, size, created, mimeType}}, written last
+#
+# as a directory, or as the same layout inside islandora_5.tar / islandora_5.zip.  Datastreams
+# come down through download_datastream (resumed, checksum-verified) into a scratch file one at a time
+# per worker, so memory stays at about max_workers * buffer_size whatever the datastream sizes.
+#
+# Against a previous export, datastreams whose checksum (or, without one, created date and size)
+# hasn't changed are copied from the old bundle instead of downloaded again.
+
+import json
+import mimetypes
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+
+from io import BytesIO
+
+from .concurrency import imap_unordered
+
+FORMATS = ('dir', 'tar', 'zip')
+
+
+def _fingerprint(info):
+    if info.get('checksum') and info['checksum'].lower() != 'none':
+        return info.get('checksumType'), info['checksum'].lower()
+    return info.get('created'), info.get('size')
+
+
+def _json(data):
+    return json.dumps(data, indent=2, sort_keys=True).encode('utf-8')
+
+
+class Exporter(object):
+
+    def __init__(self, client, path, format='dir', previous=None, max_workers=None, backlog=None,
+                 buffer_size=1048576, verify=True):
+        """
+
+        :param client: IslandoraClient
+        :param path: directory the bundles go in
+        :param format: 'dir', 'tar' or 'zip'
+        :param previous: directory of an earlier export (same format) to skip unchanged datastreams against -
+            for 'dir' this defaults to path, so exporting again over the top only fetches what changed
+        :param max_workers: objects exported at once, defaults to the client's max_workers
+        :param backlog: PIDs read ahead of the workers, defaults to max_workers * 2
+        :param buffer_size: download buffer, per worker
+        :param verify: check datastream checksums while downloading
+        """
+        if format not in FORMATS:
+            raise Exception("Unknown export format {}, expected one of {}".format(format, ', '.join(FORMATS)))
+        self.client = client
+        self.path = path
+        self.format = format
+        self.previous = previous if previous or format != 'dir' else path
+        self.max_workers = max_workers or client.max_workers
+        self.backlog = backlog
+        self.buffer_size = buffer_size
+        self.verify = verify
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def bundle_name(pid):
+        return pid.replace(':', '_')
+
+    def export(self, pids):
+        """
+
+        :param pids: iterable of PIDs (a Solr generator is fine, it's read as the workers need it)
+        :return: generator of BatchResult, item is the PID and result is export_object's summary
+        """
+        return imap_unordered(self.export_object, pids, self.max_workers, self.backlog)
+
+    def export_object(self, pid):
+        """
+        :return: {'bundle': path, 'downloaded': [dsid...], 'unchanged': [dsid...], 'skipped': [dsid...]}
+            - skipped are redirect/external datastreams, whose content isn't in the repository
+        """
+        name = self.bundle_name(pid)
+        profile = self.client.get_object(pid)
+        relationships = self.client.get_relationships(pid)
+        previous = self._previous(name)
+        try:
+            if self.format == 'dir':
+                return self._export_dir(pid, name, profile, relationships, previous)
+            return self._export_archive(pid, name, profile, relationships, previous)
+        finally:
+            if previous.archive:
+                previous.archive.close()
+
+    def _plan(self, profile, previous):
+        # [(dsid, info, file name, unchanged)], plus the datastreams there's no content for
+        plan, skipped = [], []
+        for info in profile.get('datastreams', []):
+            dsid = info['dsid']
+            if info.get('controlGroup') in ('R', 'E'):
+                skipped.append(dsid)
+                continue
+            extension = mimetypes.guess_extension(info.get('mimeType') or '') or ''
+            entry = previous.manifest.get(dsid)
+            unchanged = entry is not None and entry.get('fingerprint') == list(_fingerprint(info)) \
+                and previous.has(entry['file'])
+            plan.append((dsid, info, entry['file'] if unchanged else 'datastreams/' + dsid + extension, unchanged))
+        return plan, skipped
+
+    @staticmethod
+    def _manifest_entry(info, file):
+        return {
+            'file': file,
+            'checksum': info.get('checksum'),
+            'checksumType': info.get('checksumType'),
+            'size': info.get('size'),
+            'created': info.get('created'),
+            'mimeType': info.get('mimeType'),
+            'fingerprint': list(_fingerprint(info)),
+        }
+
+    def _export_dir(self, pid, name, profile, relationships, previous):
+        bundle = os.path.join(self.path, name)
+        os.makedirs(os.path.join(bundle, 'datastreams'), exist_ok=True)
+        plan, skipped = self._plan(profile, previous)
+        manifest, downloaded, unchanged = {}, [], []
+        for dsid, info, file, same in plan:
+            target = os.path.join(bundle, file)
+            if same and previous.path != bundle:
+                previous.copy_to_file(file, target)
+            elif not same:
+                self.client.download_datastream(pid, dsid, target, verify=self.verify, buffer_size=self.buffer_size)
+            (unchanged if same else downloaded).append(dsid)
+            manifest[dsid] = self._manifest_entry(info, file)
+
+        # Datastreams gone since the last export - and what's left of any interrupted downloads of them
+        kept = set()
+        for entry in manifest.values():
+            target = os.path.normpath(os.path.join(bundle, entry['file']))
+            kept.add(target)
+            kept.update(self.client.download_scratch_files(target))
+        for file in os.listdir(os.path.join(bundle, 'datastreams')):
+            if os.path.normpath(os.path.join(bundle, 'datastreams', file)) not in kept:
+                os.remove(os.path.join(bundle, 'datastreams', file))
+
+        for file, data in (('object.json', profile), ('relationships.json', relationships),
+                           ('manifest.json', manifest)):
+            temporary = os.path.join(bundle, file + '.tmp')
+            with open(temporary, 'wb') as handle:
+                handle.write(_json(data))
+            os.replace(temporary, os.path.join(bundle, file))
+        return {'bundle': bundle, 'downloaded': downloaded, 'unchanged': unchanged, 'skipped': skipped}
+
+    def _export_archive(self, pid, name, profile, relationships, previous):
+        target = os.path.join(self.path, '{}.{}'.format(name, self.format))
+        partial = target + '.part'
+        plan, skipped = self._plan(profile, previous)
+        manifest, downloaded, unchanged = {}, [], []
+        scratch = tempfile.mkdtemp(prefix='.export-', dir=self.path)
+        try:
+            with _ArchiveWriter(partial, self.format, self.buffer_size) as archive:
+                archive.add_bytes(name + '/object.json', _json(profile))
+                archive.add_bytes(name + '/relationships.json', _json(relationships))
+                for dsid, info, file, same in plan:
+                    if same:
+                        previous.copy_to_archive(file, archive, name + '/' + file)
+                        unchanged.append(dsid)
+                    else:
+                        staged = os.path.join(scratch, dsid)
+                        self.client.download_datastream(pid, dsid, staged, verify=self.verify,
+                                                        buffer_size=self.buffer_size)
+                        archive.add_file(name + '/' + file, staged)
+                        os.remove(staged)
+                        downloaded.append(dsid)
+                    manifest[dsid] = self._manifest_entry(info, file)
+                archive.add_bytes(name + '/manifest.json', _json(manifest))
+            os.replace(partial, target)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+            if os.path.exists(partial):
+                os.remove(partial)
+        return {'bundle': target, 'downloaded': downloaded, 'unchanged': unchanged, 'skipped': skipped}
+
+    def _previous(self, name):
+        if not self.previous:
+            return _Previous(None, {}, None)
+        if self.format == 'dir':
+            bundle = os.path.join(self.previous, name)
+            try:
+                with open(os.path.join(bundle, 'manifest.json'), 'rb') as handle:
+                    return _Previous(bundle, json.loads(handle.read().decode('utf-8')), None)
+            except (OSError, ValueError):
+                return _Previous(bundle, {}, None)
+        path = os.path.join(self.previous, '{}.{}'.format(name, self.format))
+        if not os.path.exists(path):
+            return _Previous(None, {}, None)
+        archive = tarfile.open(path, 'r') if self.format == 'tar' else zipfile.ZipFile(path, 'r')
+        previous = _Previous(name, {}, archive)
+        try:
+            previous.manifest = json.loads(previous.read('manifest.json').decode('utf-8'))
+        except (KeyError, ValueError):
+            pass
+        return previous
+
+
+class _Previous(object):
+    # An earlier bundle: a directory (path) or an open tar/zip (archive, with members under path/)
+
+    def __init__(self, path, manifest, archive):
+        self.path = path
+        self.manifest = manifest
+        self.archive = archive
+
+    def _member(self, file):
+        return self.path + '/' + file
+
+    def has(self, file):
+        if self.archive is None:
+            return self.path is not None and os.path.exists(os.path.join(self.path, file))
+        try:
+            if isinstance(self.archive, tarfile.TarFile):
+                self.archive.getmember(self._member(file))
+            else:
+                self.archive.getinfo(self._member(file))
+            return True
+        except KeyError:
+            return False
+
+    def open(self, file):
+        if isinstance(self.archive, tarfile.TarFile):
+            return self.archive.extractfile(self._member(file))
+        return self.archive.open(self._member(file))
+
+    def read(self, file):
+        with self.open(file) as handle:
+            return handle.read()
+
+    def copy_to_file(self, file, target):
+        source = os.path.join(self.path, file)
+        temporary = target + '.tmp'
+        shutil.copyfile(source, temporary)
+        os.replace(temporary, target)
+
+    def copy_to_archive(self, file, archive, arcname):
+        if self.archive is None:
+            archive.add_file(arcname, os.path.join(self.path, file))
+        elif isinstance(self.archive, tarfile.TarFile):
+            member = self.archive.getmember(self._member(file))
+            archive.add_stream(arcname, self.archive.extractfile(member), member.size)
+        else:
+            size = self.archive.getinfo(self._member(file)).file_size
+            with self.archive.open(self._member(file)) as source:
+                archive.add_stream(arcname, source, size)
+
+
+class _ArchiveWriter(object):
+    # tar or zip, written member by member straight to disk
+
+    def __init__(self, path, format, buffer_size):
+        self.format = format
+        self.buffer_size = buffer_size
+        if format == 'tar':
+            self.archive = tarfile.open(path, 'w', format=tarfile.PAX_FORMAT)
+        else:
+            self.archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+
+    def add_bytes(self, arcname, data):
+        self.add_stream(arcname, BytesIO(data), len(data))
+
+    def add_file(self, arcname, path):
+        if self.format == 'tar':
+            self.archive.add(path, arcname)
+        else:
+            self.archive.write(path, arcname)
+
+    def add_stream(self, arcname, source, size):
+        if self.format == 'tar':
+            member = tarfile.TarInfo(arcname)
+            member.size = size
+            member.mtime = time.time()
+            self.archive.addfile(member, source)
+        else:
+            with self.archive.open(arcname, 'w', force_zip64=True) as target:
+                shutil.copyfileobj(source, target, self.buffer_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.archive.close()
@@ -0,0 +1,184 @@
+# /islandora7_rest/Ingest.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Bulk ingest from a manifest, as a three-stage pipeline:
+#
+#   create_object  ->  content models, collections, other relationships  ->  create_datastream(s)
+#
+# each stage with its own threads and a bounded queue in front of it, so object B is being created
+# while object A's datastreams upload, and a manifest of tens of thousands of rows is read only as
+# fast as the uploads keep up.  Relationship changes for one object stay one after another (each
+# rewrites RELS-EXT), as in reconcile_relationships.
+#
+# With a journal every finished step is recorded - including the PID create_object handed back,
+# so a rerun picks up the same object instead of making a second one.
+#
+# Manifests are JSON lines:
+#
+#   {"id": "row1", "namespace": "ku", "label": "A photo", "models": ["islandora:sp_basic_image"],
+#    "collections": ["ku:photos"], "relationships": [["info:fedora/fedora-system:def/relations-external#",
+#    "isPartOf", "ku:5"]], "datastreams": [{"dsid": "OBJ", "file": "photo.jpg"},
+#    {"dsid": "MODS", "file": "photo.xml", "mimeType": "application/xml"}]}
+#
+# or CSV with the columns id, pid, namespace, label, owner, state, models and collections
+# ('|' between values), relationships (as JSON) and a column per datastream, ds.OBJ, ds.MODS...
+# holding the file name.  Rows without an id are known by their pid, then by their line number.
+# Relative file names are relative to the manifest, wherever it's run from.
+
+import csv
+import json
+import mimetypes
+import os
+
+from .concurrency import pipelined
+from .journal import Journal
+
+OBJECT_FIELDS = ('pid', 'namespace', 'label', 'owner', 'state')
+
+
+def read_manifest(path):
+    """
+    :param path: a .csv file, anything else is read as JSON lines
+    :return: generator of records, read as needed
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r', encoding='utf-8', newline='') as manifest:
+        if path.lower().endswith('.csv'):
+            for line, row in enumerate(csv.DictReader(manifest), 2):
+                yield _relative_to(_record(_from_csv(row), line), directory)
+        else:
+            for line, text in enumerate(manifest, 1):
+                if text.strip():
+                    yield _relative_to(_record(json.loads(text), line), directory)
+
+
+def _relative_to(record, directory):
+    record['datastreams'] = [dict(datastream, file=os.path.join(directory, datastream['file']))
+                             if datastream.get('file') else datastream
+                             for datastream in record.get('datastreams') or ()]
+    return record
+
+
+def _from_csv(row):
+    record = dict((field, row[field]) for field in OBJECT_FIELDS + ('id',) if row.get(field))
+    for field in ('models', 'collections'):
+        record[field] = [value for value in (row.get(field) or '').split('|') if value]
+    record['relationships'] = json.loads(row['relationships']) if row.get('relationships') else []
+    record['datastreams'] = [{'dsid': column[3:], 'file': value}
+                             for column, value in row.items() if column and column.startswith('ds.') and value]
+    return record
+
+
+def _record(record, line):
+    record = dict(record)
+    record['id'] = str(record.get('id') or record.get('pid') or 'line {}'.format(line))
+    return record
+
+
+class Ingest(object):
+
+    def __init__(self, client, journal=None, object_workers=4, relationship_workers=4, datastream_workers=8,
+                 queue_size=None):
+        """
+
+        :param client: IslandoraClient
+        :param journal: path to a progress journal (optional)
+        :param object_workers: create_object calls at once
+        :param relationship_workers: objects having relationships added at once
+        :param datastream_workers: objects having datastreams uploaded at once (an object's own go one by one)
+        :param queue_size: objects waiting in front of each stage, defaults to twice its workers
+        """
+        self.client = client
+        self.journal = Journal(journal) if journal else None
+        self.object_workers = object_workers
+        self.relationship_workers = relationship_workers
+        self.datastream_workers = datastream_workers
+        self.queue_size = queue_size
+
+    def ingest(self, records):
+        """
+
+        :param records: a manifest path, or an iterable of records (dictionaries as in a JSON lines manifest)
+        :return: generator of BatchResult, item is the record's id and result is its PID -
+            records the journal says are finished aren't sent or yielded again
+        """
+        if isinstance(records, str):
+            records = read_manifest(records)
+        else:
+            records = (_record(record, line) for line, record in enumerate(records, 1))
+        stages = [
+            (self._create_object, self.object_workers),
+            (self._add_relationships, self.relationship_workers),
+            (self._create_datastreams, self.datastream_workers),
+        ]
+        return (batch_result._replace(item=batch_result.item['id'])
+                for batch_result in pipelined(self._pending(records), stages, self.queue_size))
+
+    def _pending(self, records):
+        for record in records:
+            if not self._done(record['id']):
+                yield record
+
+    def _done(self, key):
+        return self.journal is not None and self.journal.is_done(key)
+
+    def _record(self, key, **details):
+        if self.journal:
+            self.journal.record(key, **details)
+
+    def _step(self, key, pid, step, *args, **kwargs):
+        # One journaled call - a failure is written down and passed on
+        try:
+            result = step(*args, **kwargs)
+        except Exception as error:
+            if self.journal:
+                self.journal.record(key, 'failed', pid=pid, error=str(error))
+            raise
+        self._record(key, pid=pid)
+        return result
+
+    def _create_object(self, record):
+        key = record['id'] + ' object'
+        if self._done(key):
+            return dict(record, pid=self.journal.get(key)['pid'])
+        fields = dict((field, record[field]) for field in OBJECT_FIELDS if record.get(field))
+        try:
+            created = self.client.create_object(**fields)
+        except Exception as error:
+            if self.journal:
+                self.journal.record(key, 'failed', error=str(error))
+            raise
+        pid = created.get('pid') or record.get('pid')
+        self._record(key, pid=pid)
+        return dict(record, pid=pid)
+
+    def _add_relationships(self, record):
+        key = record['id'] + ' relationships'
+        pid = record['pid']
+        if not self._done(key):
+            self._step(key, pid, self._relationships, record)
+        return record
+
+    def _relationships(self, record):
+        pid = record['pid']
+        for cmodel in record.get('models', []):
+            self.client.add_content_model(pid, cmodel)
+        for parent_pid in record.get('collections', []):
+            self.client.add_collection_membership(pid, parent_pid)
+        for relationship in record.get('relationships', []):
+            self.client.add_relationship(pid, *relationship)
+
+    def _create_datastreams(self, record):
+        pid = record['pid']
+        for datastream in record.get('datastreams', []):
+            datastream = dict(datastream)
+            dsid = datastream.pop('dsid')
+            key = '{} datastream {}'.format(record['id'], dsid)
+            if self._done(key):
+                continue
+            if isinstance(datastream.get('file'), str) and 'mimeType' not in datastream:
+                datastream['mimeType'] = mimetypes.guess_type(datastream['file'])[0] or 'application/octet-stream'
+            self._step(key, pid, self.client.create_datastream, pid, dsid, **datastream)
+        self._record(record['id'], pid=pid)
+        return pid
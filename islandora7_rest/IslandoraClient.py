@@ -25,33 +25,156 @@
 # GET       /islandora/rest/v1/solr/{query}                         SEARCH for objects.
 #                                                                       {query} is solr query
 
+import functools
+import itertools
 import json
 import requests
 import os
+import threading
+import time
+import urllib3
 
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, urlencode
 
+from .IslandoraSession import IslandoraSession
+from .checksum import new_hasher
+from .coalesce import SingleFlight
+from .concurrency import imap_unordered, merged, prefetched
+from .cursor import SolrCursor
+from .multipart import MultipartUpload
+from .results import DatastreamInfo, ObjectProfile, Relationship, collect, solr_doc
+from .solrstream import SolrStream
 
-class IslandoraClient(requests.Session):
 
-    def __init__(self, rest_url=None, user=None, token=None):
+class IslandoraClient(IslandoraSession):
+    api_path = 'v1/'
+
+    def __init__(self, rest_url=None, user=None, token=None, max_workers=8, cache=None, retry=None, limiter=None,
+                 metrics=None, transport=None, coalesce=False, solr_terms_parser=True):
         """
 
         :param rest_url: URL to Islandora Rest, not including the v1/
         :param user: Islandora user
         :param token: Token/Password
+        :param max_workers: default thread count for the batch methods (get_objects, etc.),
+            the connection pool is sized to match
+        :param cache: optional cache.MemoryCache or cache.SqliteCache for get_object,
+            get_relationships and get_datastream_info
+        :param retry: optional retry.RetryPolicy
+        :param limiter: optional retry.AdaptiveLimiter
+        :param metrics: optional metrics.Metrics
+        :param transport: optional transport.Transport, to share one connection pool with other clients
+        :param coalesce: threads making the same get_object, get_relationships, get_datastream_info or
+            solr_query call at the same time share one request (see coalesce.py)
+        :param solr_terms_parser: the batch lookups (reconcile_relationships_bulk with solr_prefetch,
+            BulkPurge, DeltaSync.purged) query Solr with {!terms}, which needs Solr 4.10 or later -
+            False sends (field:"a" OR field:"b" ...) instead, for older Solr; keep their chunk sizes
+            down (50 or so) then, the OR form is longer and the query goes in the URL
         """
-        super(IslandoraClient, self).__init__()
-        self.url_base = rest_url
-        if self.url_base[-1] != "/":
-            self.url_base = rest_url + "/"
-        if user and token:
-            self.auth = (user, token)
+        super(IslandoraClient, self).__init__(rest_url, user, token, max_workers=max_workers,
+                                              retry=retry, limiter=limiter, metrics=metrics, transport=transport)
+        self.cache = cache
+        self.single_flight = SingleFlight() if coalesce else None
+        self.solr_terms_parser = solr_terms_parser
+        # Bumped by every change to a PID, so a read that started before the change can't cache what it got
+        self._generations = {}
+        self._generations_lock = threading.Lock()
+
+    def _request_key(self, url, params):
+        # The server and the user are part of it - a SqliteCache can be shared by clients for different
+        # servers or users, and what one user may see (XACML) isn't necessarily what another may
+        if params:
+            url += '?' + urlencode(sorted((k, v) for k, v in params.items() if v is not None), doseq=True)
+        user = self.auth[0] if isinstance(self.auth, tuple) else ''
+        return '{}@{}{}{}'.format(user, self.url_base, self.api_path, url)
+
+    def _get_json(self, url, pid, params=None, dsid=None):
+        # The read-only lookups come through here, so the cache (if there is one) can answer them,
+        # and identical calls in flight at the same time can be merged into one.
+        # dsid: the datastream the answer depends on, to revalidate it against the object profile
+        key = self._request_key(url, params)
+        if self.single_flight is not None:
+            return json.loads(self.single_flight.do(key, lambda: self._get_body(url, key, pid, params, dsid),
+                                                    tag=pid))
+        return json.loads(self._get_body(url, key, pid, params, dsid))
+
+    def _get_body(self, url, key, pid, params, dsid=None, refresh=False):
+        # A stale cache entry is revalidated with If-None-Match/If-Modified-Since when we have them,
+        # and against its datastream's created date and checksum in a fresh object profile if it has those.
+        if self.cache is None:
+            response = self.get(url, params=params)
+            response.raise_for_status()
+            return response.content
 
-    def request(self, method, url, **kwargs):
-        modified_url = self.url_base + 'v1/' + url
-        return super(IslandoraClient, self).request(method, modified_url,
-                                                    **kwargs)
+        generation = self._generation(pid)
+        entry = self.cache.get(key)
+        if entry is not None and entry.fresh and not refresh:
+            return entry.body
+        if entry is not None and entry.validator and dsid and self._revalidate(pid, dsid, entry):
+            self._store(key, pid, generation, entry.body, entry.etag, entry.last_modified, entry.validator)
+            return entry.body
+        # Taken before the GET - a validator from after it could vouch for a change this body predates
+        validator = self._validator(pid, dsid) if dsid else None
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        response = self.get(url, params=params, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            self._store(key, pid, generation, entry.body, entry.etag, entry.last_modified, entry.validator)
+            return entry.body
+        response.raise_for_status()
+        self._store(key, pid, generation, response.content, response.headers.get('ETag'),
+                    response.headers.get('Last-Modified'), validator)
+        return response.content
+
+    def _profile_key(self, pid):
+        return self._request_key("object/{}".format(pid), None)
+
+    @staticmethod
+    def _datastream_validator(profile, dsid):
+        for info in profile.get('datastreams') or ():
+            if info.get('dsid') == dsid and info.get('created'):
+                return '{} {}'.format(info['created'], info.get('checksum'))
+        return None
+
+    def _validator(self, pid, dsid):
+        # From whatever profile is cached already (fresh or not) - never a request of its own
+        profile = self.cache.get(self._profile_key(pid))
+        return self._datastream_validator(json.loads(profile.body), dsid) if profile is not None else None
+
+    def _revalidate(self, pid, dsid, entry):
+        # A profile fetched after entry went stale is as good as asking again - one GET for all of the
+        # object's stale entries
+        key = self._profile_key(pid)
+        profile = self.cache.get(key)
+        if profile is None or not profile.fresh or profile.expires - entry.expires < self.cache.ttl:
+            body = self._get_body("object/{}".format(pid), key, pid, None, refresh=True)
+        else:
+            body = profile.body
+        return self._datastream_validator(json.loads(body), dsid) == entry.validator
+
+    def _generation(self, pid):
+        with self._generations_lock:
+            return self._generations.get(pid, 0)
+
+    def _store(self, key, pid, generation, body, etag, last_modified, validator):
+        with self._generations_lock:
+            # Changed through the client since this read started - what it got may be out of date
+            if self._generations.get(pid, 0) != generation:
+                return
+            self.cache.set(key, pid, body, etag, last_modified, validator)
+
+    def _invalidate(self, pid):
+        # Anything that changes an object throws out what we've cached about it
+        if self.cache is not None:
+            with self._generations_lock:
+                self._generations[pid] = self._generations.get(pid, 0) + 1
+            self.cache.invalidate(pid)
+        if self.single_flight is not None:
+            self.single_flight.forget(pid)
 
     # Objects:
     # GET       /islandora/rest/v1/object/{pid}    GET existing object
@@ -59,11 +182,15 @@ class IslandoraClient(requests.Session):
     # PUT       /islandora/rest/v1/object/{pid}    CREATE new object
     # DELETE    /islandora/rest/v1/object/{pid}    DELETE existing obj
 
-    def get_object(self, pid):
+    def get_object(self, pid, typed=False):
+        """
+
+        :param pid:
+        :param typed: return a results.ObjectProfile instead of a dictionary
+        """
         url = "object/{}".format(pid)
-        response = self.get(url)
-        response.raise_for_status()
-        return response.json()
+        profile = self._get_json(url, pid)
+        return ObjectProfile.from_dict(profile) if typed else profile
 
     def update_object(self, pid, **changed_object_as_kwargs):
         """
@@ -74,6 +201,7 @@ class IslandoraClient(requests.Session):
         """
         url = "object/{}".format(pid)
         response = self.put(url, json=changed_object_as_kwargs)
+        self._invalidate(pid)
         response.raise_for_status()
         return response.json()
 
@@ -94,56 +222,207 @@ class IslandoraClient(requests.Session):
             raise Exception("Missing PID")
         url = "object/{}".format(pid)
         response = self.delete(url)
+        self._invalidate(pid)
         response.raise_for_status()
         return response
 
+    # Batch versions run on a thread pool and yield a BatchResult(item, result, error)
+    # for each item as it finishes - order is NOT preserved, and a failed item carries
+    # its own error rather than stopping the batch.
+
+    def get_objects(self, pids, max_workers=None):
+        """
+
+        :param pids: iterable of PIDs
+        :param max_workers: defaults to the client's max_workers
+        :return: generator of BatchResult, item is the PID
+        """
+        return imap_unordered(self.get_object, pids, max_workers or self.max_workers)
+
+    def delete_objects(self, pids, max_workers=None):
+        """
+        No ordering between them - to take down a collection tree members first, see BulkPurge
+
+        :param pids: iterable of PIDs
+        :param max_workers: defaults to the client's max_workers
+        :return: generator of BatchResult, item is the PID
+        """
+        return imap_unordered(self.delete_object, pids, max_workers or self.max_workers)
+
     # GET       /islandora/rest/v1/solr/{query}        SEARCH for objects.
     # Raw response document as a Python dictionary structure
 
-    def solr_query(self, query="*:*", **params):
+    def solr_query(self, query="*:*", streaming=False, **params):
+        """
+
+        :param query:
+        :param streaming: return a SolrStream that decodes response.docs one at a time as they
+            come off the socket, rather than the whole decoded page. See solrstream.py
+        :param params:
+        """
         url = "solr/{}".format(quote_plus(query))
+        if streaming:
+            response = self.get(url, params=params, stream=True)
+            response.raise_for_status()
+            return SolrStream(response)
+        if self.single_flight is not None:
+            return json.loads(self.single_flight.do(self._request_key(url, params),
+                                                    lambda: self._solr_body(url, params)))
+        return json.loads(self._solr_body(url, params))
+
+    def _solr_body(self, url, params):
         response = self.get(url, params=params)
         response.raise_for_status()
-        return response.json()
+        return response.content
 
     # Convenient yield generator for documents from a Solr query
     # 'fl' defaults to just the PID
     # Cursor logic - if you want 'start' to work, run a solr_query()
 
-    def solr_generator(self, query="*:*", **params):
+    def solr_generator(self, query="*:*", prefetch=0, streaming=False, cursor=None, checkpoint=None,
+                       checkpoint_every=1000, typed=False, **params):
         """
 
         :param query:
+        :param prefetch: number of pages to fetch ahead in a background thread while the
+            current page is being consumed.  0 (default) fetches a page only when it's needed.
+        :param streaming: decode each page's docs as they arrive (flat memory for big 'rows')
+        :param cursor: a cursor.SolrCursor to carry on from (its query and params are used).
+            It's kept up to date as docs are handed over, so you can save() it yourself.
+        :param checkpoint: file to save the cursor to every checkpoint_every docs, and when the walk ends or stops.
+            If the file exists (and no cursor is given), the walk resumes from it.
+        :param checkpoint_every: docs between checkpoint saves
+        :param typed: yield results.SolrDoc objects (__slots__, far smaller) instead of dictionaries
         :param params:
         """
-        if 'start' in params.keys():
-            del params['start']
-        if 'rows' not in params.keys():
-            params['rows'] = 100
-        if 'sort' not in params.keys():
-            params['sort'] = "PID asc"
-        if 'fl' not in params.keys():
-            params['fl'] = "PID"
-        params['cursorMark'] = '*'
+        if cursor is None and checkpoint and os.path.exists(checkpoint):
+            cursor = SolrCursor.load(checkpoint)
+        if cursor is None:
+            if 'start' in params.keys():
+                del params['start']
+            if 'rows' not in params.keys():
+                params['rows'] = 100
+            if 'sort' not in params.keys():
+                params['sort'] = "PID asc"
+            if 'fl' not in params.keys():
+                params['fl'] = "PID"
+            cursor = SolrCursor(query, params)
+        if cursor.done:
+            return
+        query = cursor.query
+        params = dict(cursor.params, cursorMark=cursor.cursor_mark)
+
+        pages = self._solr_pages(query, params, streaming)
+        if streaming:
+            # A streamed page only knows its nextCursorMark once it's been read to the end,
+            # so read-ahead happens doc by doc instead of page by page
+            docs = ((mark, doc) for mark, page in pages for doc in page)
+            if prefetch:
+                docs = prefetched(docs, prefetch * int(params['rows']))
+        else:
+            if prefetch:
+                pages = prefetched(pages, prefetch)
+            docs = ((mark, doc) for mark, page in pages for doc in page)
 
+        # Resuming part way through a page: skip what was handed over last time
+        skip = cursor.offset
+        try:
+            for mark, doc in docs:
+                if mark != cursor.cursor_mark:
+                    cursor.cursor_mark = mark
+                    cursor.offset = skip = 0
+                elif skip:
+                    skip -= 1
+                    continue
+                yield solr_doc(doc) if typed else doc
+                # Back for more, so that one's been dealt with
+                cursor.offset += 1
+                cursor.count += 1
+                if checkpoint and cursor.count % checkpoint_every == 0:
+                    cursor.save(checkpoint)
+            cursor.done = True
+        finally:
+            # However the walk ends - finished, the loop broken out of, an exception - so a resume
+            # starts at the first doc that wasn't dealt with rather than the last periodic save
+            if checkpoint:
+                cursor.save(checkpoint)
+
+    def solr_collect(self, query="*:*", **params):
+        """
+        A whole solr_generator walk kept as columns (results.Columns), not a list of dictionaries -
+        numeric fields end up in arrays.
+
+        :param query:
+        :param params: as for solr_generator (fl, fq, prefetch, streaming...)
+        :return: results.Columns
+        """
+        return collect(self.solr_generator(query, **params))
+
+    def _solr_pages(self, query, params, streaming=False):
+        # (cursorMark, docs) per page - docs is a list, or a SolrStream when streaming
         while True:
-            results = self.solr_query(query, **params)
+            cursor_mark = params['cursorMark']
+            if streaming:
+                results = self.solr_query(query, streaming=True, **params)
+                yield cursor_mark, results
+                results = results.envelope
+            else:
+                results = self.solr_query(query, **params)
+                yield cursor_mark, results['response']['docs']
             nextCursorMark = results['nextCursorMark']
-            for result in results['response']['docs']:
-                yield result
             # We're done here
             if nextCursorMark == params['cursorMark']:
                 break
             params['cursorMark'] = nextCursorMark
 
+    def solr_sharded_generator(self, query="*:*", shards=None, max_workers=None, prefetch=0, **params):
+        """
+        Splits a query into disjoint slices (one fq per shard) and walks each with its own cursor,
+        several at a time.  Docs come back interleaved across shards - NOT in sort order.
+        The shards must not overlap, or you'll get documents twice.
+
+        :param query:
+        :param shards: list of fq filters partitioning the results, e.g. from pid_range_shards()
+        :param max_workers: shards walked at once, defaults to the client's max_workers
+        :param prefetch: read-ahead pages per shard, see solr_generator
+        :param params: as solr_generator; an existing fq is kept and the shard's fq is added to it
+        """
+        if not shards:
+            raise Exception("Missing shards")
+        fq = params.pop('fq', [])
+        if isinstance(fq, str):
+            fq = [fq]
+
+        def walk(shard):
+            return self.solr_generator(query, prefetch=prefetch, fq=fq + [shard], **params)
+
+        return merged([functools.partial(walk, shard) for shard in shards], max_workers or self.max_workers)
+
+    @staticmethod
+    def pid_range_shards(boundaries, field='PID'):
+        """
+        Builds non-overlapping range filters for solr_sharded_generator from sorted split points:
+        ['islandora:5', 'ku:'] -> PID:[* TO "islandora:5"}, PID:["islandora:5" TO "ku:"}, PID:["ku:" TO *]
+
+        :param boundaries: sorted values of field to split at
+        :param field: a sortable string field
+        :return: list of fq strings
+        """
+        edges = ['*'] + ['"{}"'.format(boundary) for boundary in boundaries] + ['*']
+        shards = []
+        for low, high in zip(edges, edges[1:]):
+            shards.append('{}:[{} TO {}{}'.format(field, low, high, ']' if high == '*' else '}'))
+        return shards
+
     # Relationships:
     # GET       /islandora/rest/v1/object/{pid}/relationship?{params}   LIST existing relationships
     # POST      /islandora/rest/v1/object/{pid}/relationship            ADD a new relationship
     # DELETE    /islandora/rest/v1/object/{pid}/relationship            REMOVE an existing relationship
 
-    def get_relationships(self, pid, **kwargs):
+    def get_relationships(self, pid, typed=False, **kwargs):
         """
         :param pid:
+        :param typed: return a list of results.Relationship instead of dictionaries
         :param kwargs:
           This could include fields like predicate, uri (which in my mind should be called namespace, but it's uri here),
           object, and literal... these are passed as GET params
@@ -151,9 +430,8 @@ class IslandoraClient(requests.Session):
         """
         if not pid:
             raise Exception("Missing PID")
-        response = self.get("object/{}/relationship".format(pid), params=kwargs)
-        response.raise_for_status()
-        return response.json()
+        relationships = self._get_json("object/{}/relationship".format(pid), pid, params=kwargs, dsid='RELS-EXT')
+        return [Relationship.from_dict(relationship) for relationship in relationships] if typed else relationships
 
     def add_relationship(self, pid, ns, predicate, object, type='uri'):
         if not pid:
@@ -164,6 +442,7 @@ class IslandoraClient(requests.Session):
             "object": object,
             "type": type
         })
+        self._invalidate(pid)
         response.raise_for_status()
         return response
 
@@ -178,6 +457,7 @@ class IslandoraClient(requests.Session):
         json_data["literal"] = 1 if literal else 0
 
         response = self.delete("object/{}/relationship".format(pid), json=json_data)
+        self._invalidate(pid)
         response.raise_for_status()
         return response
 
@@ -230,6 +510,134 @@ class IslandoraClient(requests.Session):
                                  ns='info:fedora/fedora-system:def/relations-external#',
                                  object=parent_pid_to_remove)
 
+    # Declarative relationships: say what a PID's relationships should be, and only the
+    # difference gets sent.  Relationships are tuples of (ns, predicate, object) - or
+    # (ns, predicate, object, type) for adds that aren't type='uri'.
+    #
+    # Changes to ONE object go out one after another: each add/remove rewrites the whole
+    # RELS-EXT datastream server-side, so two at once can lose one of them.
+    # The bulk version runs many objects at once instead.
+
+    @staticmethod
+    def _relationship_tuples(relationships):
+        # get_relationships() output -> set of (ns, predicate, object, literal)
+        return set((rel['predicate'].get('namespace'), rel['predicate']['value'], rel['object']['value'],
+                    bool(rel['object'].get('literal'))) for rel in relationships)
+
+    def reconcile_relationships(self, pid, desired, predicates=(), current=None):
+        """
+        Makes pid's relationships on the managed predicates exactly `desired`.
+        Managed predicates are every (ns, predicate) in desired, plus any in `predicates` -
+        so pass predicates to clear one out entirely.  Everything else is left alone.
+
+        :param pid:
+        :param desired: iterable of (ns, predicate, object) or (ns, predicate, object, type)
+        :param predicates: extra (ns, predicate) pairs to manage
+        :param current: set of (ns, predicate, object, literal) if you already know them,
+            otherwise one get_relationships() call finds out
+        :return: (added, removed) - lists of the tuples changed
+        """
+        if not pid:
+            raise Exception("Missing PID")
+        wanted = {}
+        for relationship in desired:
+            wanted[tuple(relationship[:3])] = relationship[3] if len(relationship) > 3 else 'uri'
+        managed = set(predicates) | set(triple[:2] for triple in wanted)
+        if current is None:
+            current = self._relationship_tuples(self.get_relationships(pid))
+
+        have = set()
+        removed = []
+        for ns, predicate, object, literal in current:
+            if (ns, predicate) not in managed:
+                continue
+            have.add((ns, predicate, object))
+            if (ns, predicate, object) not in wanted:
+                self.remove_relationship(pid, predicate=predicate, ns=ns, object=object, literal=literal)
+                removed.append((ns, predicate, object))
+        added = []
+        for (ns, predicate, object), type in wanted.items():
+            if (ns, predicate, object) not in have:
+                self.add_relationship(pid, ns=ns, predicate=predicate, object=object, type=type)
+                added.append((ns, predicate, object, type))
+        return added, removed
+
+    def reconcile_relationships_bulk(self, items, predicates=(), solr_prefetch=False, max_workers=None,
+                                     chunk_size=100):
+        """
+        reconcile_relationships over many PIDs, several PIDs at a time.
+
+        With solr_prefetch, current relationships come from the RELS_EXT_{predicate}_uri_ms /
+        _literal_ms fields of one Solr query per chunk_size PIDs, instead of one GET per PID.
+        Solr only knows predicate names, so the namespace is taken from desired/predicates -
+        and Solr may lag behind Fedora, so don't prefetch right after changing things.
+        PIDs Solr doesn't have are looked up over REST as usual.
+
+        :param items: iterable of (pid, desired)
+        :param predicates: extra (ns, predicate) pairs to manage, for every PID
+        :param solr_prefetch: see above
+        :param max_workers: defaults to the client's max_workers
+        :param chunk_size: PIDs per Solr prefetch query
+        :return: generator of BatchResult, item is the PID and result is (added, removed)
+        """
+        known = {}
+        desired_by_pid = {}
+
+        def pids():
+            for chunk in self._chunks(items, chunk_size):
+                if solr_prefetch:
+                    known.update(self._solr_relationships(chunk, predicates))
+                for pid, desired in chunk:
+                    desired_by_pid[pid] = desired
+                    yield pid
+
+        def reconcile(pid):
+            return self.reconcile_relationships(pid, desired_by_pid.pop(pid), predicates, known.pop(pid, None))
+
+        return imap_unordered(reconcile, pids(), max_workers or self.max_workers)
+
+    @staticmethod
+    def _chunks(items, size):
+        items = iter(items)
+        chunk = list(itertools.islice(items, size))
+        while chunk:
+            yield chunk
+            chunk = list(itertools.islice(items, size))
+
+    def _terms_query(self, field, values):
+        # Any of values in field.  The Solr query goes in the URL path, and Apache turns away request lines
+        # over 8190 bytes - {!terms} takes far fewer of them than (field:"a" OR field:"b" OR ...), but it
+        # only arrived in Solr 4.10, and plenty of Islandora 7 sites are still on 4.2
+        if self.solr_terms_parser:
+            return '{{!terms f={}}}{}'.format(field, ','.join(values))
+        return '({})'.format(' OR '.join('{}:"{}"'.format(field, value.replace('\\', '\\\\').replace('"', '\\"'))
+                                         for value in values))
+
+    def _solr_relationships(self, chunk, predicates):
+        # {pid: set of (ns, predicate, object, literal)} for the managed predicates, from Solr
+        namespaces = dict((predicate, ns) for ns, predicate in predicates)
+        for pid, desired in chunk:
+            for relationship in desired:
+                namespaces.setdefault(relationship[1], relationship[0])
+        fields = ['PID']
+        for predicate in namespaces:
+            fields += ['RELS_EXT_{}_uri_ms'.format(predicate), 'RELS_EXT_{}_literal_ms'.format(predicate)]
+        query = self._terms_query('PID', [pid for pid, desired in chunk])
+        results = self.solr_query(query, rows=len(chunk), fl=','.join(fields))
+
+        found = {}
+        for doc in results['response']['docs']:
+            current = set()
+            for predicate, ns in namespaces.items():
+                for value in doc.get('RELS_EXT_{}_uri_ms'.format(predicate), []):
+                    if value.startswith('info:fedora/'):
+                        value = value[len('info:fedora/'):]
+                    current.add((ns, predicate, value, False))
+                for value in doc.get('RELS_EXT_{}_literal_ms'.format(predicate), []):
+                    current.add((ns, predicate, value, True))
+            found[doc['PID']] = current
+        return found
+
     # Datastreams:
     # GET       /islandora/rest/v1/object/{pid}/datastream/{dsid}       GET a datastream for an object
     # POST      /islandora/rest/v1/object/{pid}/datastream/             CREATE a datastream on object
@@ -256,7 +664,114 @@ class IslandoraClient(requests.Session):
         else:
             return response.iter_content(streaming_size)
 
-    def get_datastream_info(self, pid, dsid, version=None):
+    @staticmethod
+    def download_scratch_files(path):
+        """ The files download_datastream keeps beside path until it's finished: (partial file, version record) """
+        partial = path + '.part'
+        return partial, partial + '.json'
+
+    def download_datastream(self, pid, dsid, path, version=None, verify=True, retries=5, buffer_size=1048576):
+        """
+        Streams a datastream to a file.
+        Goes to path + '.part' first, and picks up where it left off with an HTTP Range
+        request if the connection drops (or if a .part is left over from an earlier run - as long as
+        path + '.part.json' says it's of the same version of the datastream; otherwise it starts over).
+        The checksum from get_datastream_info is checked as the bytes go by.
+
+        :param pid:
+        :param dsid:
+        :param path: where the file ends up
+        :param version:
+        :param verify: check the datastream's checksum (if it has one)
+        :param retries: connection failures to resume from before giving up
+        :param buffer_size: bytes read per block, into one reused buffer
+        :return: the datastream info dictionary
+        """
+        if not pid:
+            raise Exception("Missing PID")
+        if not dsid:
+            raise Exception("Missing DSID")
+        info = self.get_datastream_info(pid, dsid, version)
+        expected = info.get('checksum')
+        hasher = None
+        if verify and expected and expected.lower() != 'none':
+            hasher = new_hasher(info.get('checksumType'))
+
+        params = {
+            "content": "true",
+            "version": version
+        }
+        url = "object/{}/datastream/{}".format(pid, dsid)
+        partial, version_file = self.download_scratch_files(path)
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        failures = 0
+
+        # Which version the .part holds - a leftover from a datastream that has changed since would
+        # otherwise be spliced onto the new one
+        this_version = dict((key, info.get(key)) for key in ('created', 'size', 'checksum'))
+        resume = False
+        if os.path.exists(partial) and os.path.exists(version_file):
+            try:
+                with open(version_file, 'r', encoding='utf-8') as version_handle:
+                    resume = json.load(version_handle) == this_version
+            except ValueError:
+                pass
+        if not resume:
+            with open(version_file, 'w', encoding='utf-8') as version_handle:
+                json.dump(this_version, version_handle)
+
+        with open(partial, 'r+b' if resume else 'w+b') as file_handle:
+            if hasher:
+                # Leftovers from an earlier run - the only time anything gets re-read
+                read = file_handle.readinto(view)
+                while read:
+                    hasher.update(view[:read])
+                    read = file_handle.readinto(view)
+            offset = file_handle.seek(0, os.SEEK_END)
+            while True:
+                # identity, so Range offsets are in the same bytes we write out
+                headers = {'Accept-Encoding': 'identity'}
+                if offset:
+                    headers['Range'] = 'bytes={}-'.format(offset)
+                try:
+                    with self.get(url, params=params, headers=headers, stream=True) as response:
+                        if offset and response.status_code == 416:
+                            # Range starts at the end: we already have it all
+                            break
+                        response.raise_for_status()
+                        if offset and response.status_code != 206:
+                            # Server ignored the Range, start again from byte zero
+                            file_handle.seek(0)
+                            file_handle.truncate()
+                            offset = 0
+                            if hasher:
+                                hasher = new_hasher(info.get('checksumType'))
+                        while True:
+                            read = response.raw.readinto(view)
+                            if not read:
+                                break
+                            file_handle.write(view[:read])
+                            if hasher:
+                                hasher.update(view[:read])
+                            offset += read
+                    break
+                except (requests.ConnectionError, requests.Timeout, urllib3.exceptions.HTTPError):
+                    failures += 1
+                    if failures > retries:
+                        raise
+                    file_handle.flush()
+                    time.sleep(min(2 ** failures, 30))
+
+        os.remove(version_file)
+        if hasher and hasher.hexdigest() != expected.lower():
+            os.remove(partial)
+            raise Exception("Checksum mismatch on {}/{}: expected {}, got {}".format(
+                pid, dsid, expected, hasher.hexdigest()))
+        os.replace(partial, path)
+        return info
+
+    def get_datastream_info(self, pid, dsid, version=None, typed=False):
         if not pid:
             raise Exception("Missing PID")
         if not dsid:
@@ -266,19 +781,32 @@ class IslandoraClient(requests.Session):
             "version": version
         }
         url = "object/{}/datastream/{}".format(pid, dsid)
-        response = self.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
+        # An older version doesn't change - only the current one needs revalidating
+        info = self._get_json(url, pid, params=params, dsid=None if version else dsid)
+        return DatastreamInfo.from_dict(info) if typed else info
 
-    def create_datastream(self, pid, dsid, *, file=None, string=None, versionable=True, **metadata_as_kwargs):
+    def get_datastreams_info(self, pairs, max_workers=None):
+        """
+
+        :param pairs: iterable of (pid, dsid)
+        :param max_workers: defaults to the client's max_workers
+        :return: generator of BatchResult, item is the (pid, dsid) pair
+        """
+        return imap_unordered(lambda pair: self.get_datastream_info(*pair), pairs,
+                              max_workers or self.max_workers)
+
+    def create_datastream(self, pid, dsid, *, file=None, string=None, versionable=True, chunk_size=1048576,
+                          progress=None, **metadata_as_kwargs):
         """
 
         :return:
         :param pid:
         :param dsid:
-        :param file:
+        :param file: a file name, an open file, or any iterable of bytes - streamed, never read into memory
         :param versionable: set with a Python boolean
         :param string:
+        :param chunk_size: bytes of file read and sent at a time
+        :param progress: optional callback, progress(bytes_sent, total_bytes_or_None)
         :param metadata_as_kwargs: Passthrough to the form data
             possible - label, state, mimeType, checksumType, controlGroup
         :return:
@@ -302,20 +830,16 @@ class IslandoraClient(requests.Session):
         url = "object/{}/datastream".format(pid)
 
         if file is not None:
-            files = {
-                "file": open(file, 'rb')
-            }
-        elif string is not None:
+            response = self._upload(url, metadata_as_kwargs, file, chunk_size, progress)
+        else:
             files = {
                 "file": ('{} data'.format(dsid), string)
             }
             # only do this for string pushes...
             if 'mimetype' not in metadata_as_kwargs:
                 metadata_as_kwargs['mimeType'] = 'application/xml'
-        else:
-            files = None
-
-        response = self.post(url, data=metadata_as_kwargs, files=files)
+            response = self.post(url, data=metadata_as_kwargs, files=files)
+        self._invalidate(pid)
         response.raise_for_status()
         try:
             return response.json()
@@ -328,15 +852,18 @@ class IslandoraClient(requests.Session):
             else:
                 raise json_error
 
-    def update_datastream(self, pid, dsid, *, file=None, string=None, versionable=None, **metadata_as_kwargs):
+    def update_datastream(self, pid, dsid, *, file=None, string=None, versionable=None, chunk_size=1048576,
+                          progress=None, **metadata_as_kwargs):
         """
 
         :return:
         :param pid:
         :param dsid:
         :param versionable: Set with a Python boolean
-        :param file: optional - String representation of a file to transmit
+        :param file: optional - file name, open file or iterable of bytes to transmit (streamed)
         :param string: optional - Direct string as a file (i.e., an XML dumps())
+        :param chunk_size: bytes of file read and sent at a time
+        :param progress: optional callback, progress(bytes_sent, total_bytes_or_None)
         :param metadata_as_kwargs: Passthrough to the form data
             possible - label, state, mimeType, checksumType (can't change the controlGroup)
         :return:
@@ -353,11 +880,7 @@ class IslandoraClient(requests.Session):
                 metadata_as_kwargs['versionable'] = 1
             else:
                 metadata_as_kwargs['versionable'] = 0
-        if file is not None:
-            files = {
-                "file": open(file, 'rb')
-            }
-        elif string is not None:
+        if string is not None and file is None:
             files = {
                 "file": ('{} data'.format(dsid), string)
             }
@@ -371,10 +894,35 @@ class IslandoraClient(requests.Session):
         # We POST and say we're PUTting.
         # https://github.com/discoverygarden/islandora_rest/blob/c7edb9afe578d0a1655aded874425a6330362387/tests/islandora_rest.test#L558
         metadata_as_kwargs['method'] = "PUT"
-        response = self.post(url, data=metadata_as_kwargs, files=files)
+        if file is not None:
+            response = self._upload(url, metadata_as_kwargs, file, chunk_size, progress)
+        else:
+            response = self.post(url, data=metadata_as_kwargs, files=files)
+        self._invalidate(pid)
         response.raise_for_status()
         return response
 
+    def _upload(self, url, form_data, file, chunk_size, progress):
+        # Streams file as multipart form data, sending along the checksum of whatever
+        # checksumType was asked for so the server can verify it without us re-reading the file
+        upload = MultipartUpload(form_data, file, chunk_size=chunk_size, progress=progress,
+                                 checksum_type=form_data.get('checksumType'))
+        try:
+            return self.post(url, data=upload, headers={'Content-Type': upload.content_type})
+        finally:
+            upload.close()
+
+    def update_datastreams(self, items, max_workers=None):
+        """
+
+        :param items: iterable of (pid, dsid, kwargs) where kwargs is a dictionary of
+            update_datastream keyword arguments, e.g. ('islandora:1', 'OBJ', {'file': 'a.tif'})
+        :param max_workers: defaults to the client's max_workers
+        :return: generator of BatchResult, item is the (pid, dsid, kwargs) tuple
+        """
+        return imap_unordered(lambda item: self.update_datastream(item[0], item[1], **item[2]), items,
+                              max_workers or self.max_workers)
+
     def delete_datastream(self, pid, dsid):
         if not pid:
             raise Exception("Missing PID")
@@ -382,5 +930,15 @@ class IslandoraClient(requests.Session):
             raise Exception("Missing DSID")
         url = "object/{}/datastream/{}".format(pid, dsid)
         response = self.delete(url)
+        self._invalidate(pid)
         response.raise_for_status()
         return response
+
+    def delete_datastreams(self, pairs, max_workers=None):
+        """
+
+        :param pairs: iterable of (pid, dsid)
+        :param max_workers: defaults to the client's max_workers
+        :return: generator of BatchResult, item is the (pid, dsid) pair
+        """
+        return imap_unordered(lambda pair: self.delete_datastream(*pair), pairs, max_workers or self.max_workers)
@@ -0,0 +1,143 @@
+# /islandora7_rest/IslandoraSession.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+# http://www.ku.edu
+#
+# What IslandoraClient (v1/) and IslandoraClientKU (v1ku/) have in common:
+# URL building, auth, the connection pool, and retry / rate limiting / metrics around every request.
+
+import requests
+import time
+
+from .metrics import endpoint_template
+from .transport import Transport
+
+# Statuses that mean "slow down" rather than "you did it wrong"
+OVERLOADED = (429, 502, 503, 504)
+
+
+class IslandoraSession(requests.Session):
+    # Subclasses say which REST API they talk to
+    api_path = ''
+
+    def __init__(self, rest_url=None, user=None, token=None, max_workers=8, retry=None, limiter=None, metrics=None,
+                 transport=None):
+        """
+
+        :param rest_url: URL to Islandora Rest, not including the v1/
+        :param user: Islandora user
+        :param token: Token/Password
+        :param max_workers: default thread count for batch methods, the connection pool is sized to match
+        :param retry: optional retry.RetryPolicy
+        :param limiter: optional retry.AdaptiveLimiter, caps requests in flight across threads
+        :param metrics: optional metrics.Metrics, can be shared between clients
+        :param transport: optional transport.Transport - the connection pool, can be shared between clients
+        """
+        super(IslandoraSession, self).__init__()
+        self.url_base = rest_url
+        if self.url_base[-1] != "/":
+            self.url_base = rest_url + "/"
+        if user and token:
+            self.auth = (user, token)
+        self.max_workers = max_workers
+        self.retry = retry
+        self.limiter = limiter
+        self.metrics = metrics
+        # urllib3 keeps 10 connections per host by default, which the batch threads would
+        # overrun ("Connection pool is full, discarding connection")
+        self.transport = transport or Transport(pool_maxsize=max(max_workers, 10))
+        self.shared_transport = transport is not None
+        self.transport.mount(self)
+        if metrics is not None:
+            metrics.attach(self)
+
+    def prewarm(self, connections=None):
+        """
+        Opens connections to the server before the first requests need them
+
+        :param connections: defaults to max_workers
+        :return: connections opened
+        """
+        # verify as requests will resolve it (REQUESTS_CA_BUNDLE...), or the connections land in a different pool
+        verify = self.merge_environment_settings(self.url_base, {}, None, None, None)['verify']
+        return self.transport.prewarm(self.url_base, connections or self.max_workers, verify)
+
+    def close(self):
+        # A transport that was passed in may have other clients on it - closing it is up to whoever made it
+        if getattr(self, 'shared_transport', False):
+            for prefix in [prefix for prefix, adapter in self.adapters.items() if adapter is self.transport.adapter]:
+                del self.adapters[prefix]
+        super(IslandoraSession, self).close()
+
+    def request(self, method, url, **kwargs):
+        modified_url = self.url_base + self.api_path + url
+        endpoint = endpoint_template(self.api_path, url) if self.metrics else None
+        attempt = 0
+        while True:
+            if self.metrics:
+                for hook in self.metrics.before_request:
+                    hook(method, endpoint, kwargs)
+            if self.limiter:
+                self.limiter.acquire()
+            started = time.monotonic()
+            try:
+                response = super(IslandoraSession, self).request(method, modified_url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                latency = time.monotonic() - started
+                if self.limiter:
+                    self.limiter.release(latency, overloaded=True)
+                retrying = bool(self.retry and self.retry.can_retry(method, attempt, kwargs))
+                if self.metrics:
+                    self.metrics.record(endpoint, method, latency, error=error, retry=retrying)
+                    for hook in self.metrics.after_request:
+                        hook(method, endpoint, None, latency, error)
+                if not retrying:
+                    raise
+                delay = self.retry.backoff(attempt)
+            except Exception as error:
+                # Anything else (ChunkedEncodingError, TooManyRedirects, a hook raising...) isn't retried,
+                # but the limiter slot has to go back or the limiter fills up with requests that ended long ago
+                latency = time.monotonic() - started
+                if self.limiter:
+                    self.limiter.release(latency, failed=True)
+                if self.metrics:
+                    self.metrics.record(endpoint, method, latency, error=error, retry=False)
+                    for hook in self.metrics.after_request:
+                        hook(method, endpoint, None, latency, error)
+                raise
+            else:
+                latency = time.monotonic() - started
+                overloaded = response.status_code in OVERLOADED
+                if self.limiter:
+                    self.limiter.release(latency, overloaded=overloaded)
+                retrying = bool(self.retry and response.status_code in self.retry.status_forcelist
+                                and self.retry.can_retry(method, attempt, kwargs))
+                if self.metrics:
+                    self.metrics.record(endpoint, method, latency, status=response.status_code, retry=retrying,
+                                        bytes_sent=self._bytes_sent(response),
+                                        bytes_received=self._bytes_received(response, kwargs.get('stream')))
+                    for hook in self.metrics.after_request:
+                        hook(method, endpoint, response, latency, None)
+                if not retrying:
+                    return response
+                delay = self.retry.backoff(attempt, response)
+                response.close()
+            attempt += 1
+            time.sleep(delay)
+
+    @staticmethod
+    def _bytes_sent(response):
+        body = response.request.body
+        if body is None:
+            return 0
+        if isinstance(body, (bytes, str)):
+            return len(body)
+        # Streamed uploads (multipart.MultipartUpload) know their length
+        return getattr(body, 'len', 0)
+
+    @staticmethod
+    def _bytes_received(response, streamed):
+        # Don't read a streamed body just to count it
+        if streamed:
+            return int(response.headers.get('Content-Length', 0) or 0)
+        return len(response.content or b'')
@@ -0,0 +1,200 @@
+# /islandora7_rest/RelationshipIndex.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# A local copy of the repository's object graph, built from Solr's RELS_EXT_* fields,
+# so questions like "everything under this collection" or "objects with no content model"
+# are answered from SQLite in milliseconds instead of thousands of get_relationships calls.
+#
+#   index = RelationshipIndex("graph.db")    # or leave it in memory
+#   index.build(client)                      # one walk of Solr
+#   index.refresh(client)                    # later: only what changed since (fgs_lastModifiedDate)
+#   index.descendants("islandora:root")
+#
+# The high-water mark is when the last walk started, less safety_margin seconds - gsearch indexes
+# asynchronously, so an object changed before the newest timestamp a walk saw can still reach Solr after it.
+#
+# Solr is only as current as its last commit, and objects purged from Fedora just vanish
+# from Solr - refresh() can't see those, prune() can.
+
+import sqlite3
+
+from .timestamps import high_water_mark as walk_started
+
+MEMBERSHIP = ('isMemberOfCollection', 'isMemberOf', 'isConstituentOf')
+PREDICATES = MEMBERSHIP + ('hasModel',)
+
+
+def _strip(value):
+    return value[len('info:fedora/'):] if value.startswith('info:fedora/') else value
+
+
+class RelationshipIndex(object):
+
+    def __init__(self, path=':memory:', predicates=PREDICATES, safety_margin=300):
+        """
+
+        :param path: SQLite database file, kept between runs - or ':memory:'
+        :param predicates: RELS-EXT predicates to index (Solr's RELS_EXT_{predicate}_uri_ms)
+        :param safety_margin: seconds taken off the high-water mark, for clock skew and Solr commit lag
+        """
+        self.predicates = tuple(predicates)
+        self.safety_margin = safety_margin
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS objects (pid TEXT PRIMARY KEY, modified TEXT);
+            CREATE TABLE IF NOT EXISTS edges (subject TEXT, predicate TEXT, object TEXT);
+            CREATE INDEX IF NOT EXISTS edges_subject ON edges (subject);
+            CREATE INDEX IF NOT EXISTS edges_object ON edges (object, predicate);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    # Building
+
+    @property
+    def high_water_mark(self):
+        """ When the last build/refresh started, less safety_margin - None before the first build """
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'high_water_mark'").fetchone()
+        return row[0] if row else None
+
+    def build(self, client, query="*:*", rows=1000, **params):
+        """
+        Indexes everything query finds (replacing what's there).
+
+        :param client: IslandoraClient
+        :param query: Solr query
+        :param rows: Solr page size
+        :param params: more Solr params (fq...), passed through to solr_generator
+        :return: objects indexed
+        """
+        self.db.execute("DELETE FROM objects")
+        self.db.execute("DELETE FROM edges")
+        self.db.execute("DELETE FROM meta")
+        return self._load(client, query, rows, params, replace=False)
+
+    def refresh(self, client, query="*:*", rows=1000, **params):
+        """
+        Re-indexes only objects modified since the last build/refresh started (less safety_margin).
+        Objects changed in that overlap are looked at again - harmless, they're just replaced.
+
+        :return: objects re-indexed
+        """
+        high_water_mark = self.high_water_mark
+        if high_water_mark is None:
+            return self.build(client, query, rows, **params)
+        fq = params.pop('fq', [])
+        if isinstance(fq, str):
+            fq = [fq]
+        params['fq'] = fq + ['fgs_lastModifiedDate:[{} TO *]'.format(high_water_mark)]
+        return self._load(client, query, rows, params, replace=True)
+
+    def _load(self, client, query, rows, params, replace):
+        fields = ['RELS_EXT_{}_uri_ms'.format(predicate) for predicate in self.predicates]
+        fl = ','.join(['PID', 'fgs_lastModifiedDate'] + fields)
+        high_water_mark = walk_started(self.safety_margin)
+        objects = []
+        edges = []
+        count = 0
+        for doc in client.solr_generator(query, fl=fl, rows=rows, **params):
+            pid = doc['PID']
+            modified = doc.get('fgs_lastModifiedDate')
+            objects.append((pid, modified))
+            for predicate, field in zip(self.predicates, fields):
+                for value in doc.get(field, ()):
+                    edges.append((pid, predicate, _strip(value)))
+            count += 1
+            if len(objects) >= rows:
+                self._write(objects, edges, replace)
+                objects, edges = [], []
+        self._write(objects, edges, replace)
+        # Only once the walk has finished - stopped part way, the next refresh starts from the old mark
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('high_water_mark', ?)", (high_water_mark,))
+        self.db.commit()
+        return count
+
+    def _write(self, objects, edges, replace):
+        if replace:
+            self.db.executemany("DELETE FROM edges WHERE subject = ?", [(pid,) for pid, modified in objects])
+        self.db.executemany("INSERT OR REPLACE INTO objects VALUES (?, ?)", objects)
+        self.db.executemany("INSERT INTO edges VALUES (?, ?, ?)", edges)
+        self.db.commit()
+
+    def prune(self, client, query="*:*", rows=10000):
+        """
+        Drops objects Solr no longer has (purged), with a PID-only walk of query.
+
+        :return: PIDs dropped
+        """
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS seen (pid TEXT PRIMARY KEY)")
+        self.db.execute("DELETE FROM seen")
+        batch = []
+        for doc in client.solr_generator(query, fl='PID', rows=rows):
+            batch.append((doc['PID'],))
+            if len(batch) >= rows:
+                self.db.executemany("INSERT OR IGNORE INTO seen VALUES (?)", batch)
+                batch = []
+        self.db.executemany("INSERT OR IGNORE INTO seen VALUES (?)", batch)
+        gone = [row[0] for row in self.db.execute("SELECT pid FROM objects WHERE pid NOT IN (SELECT pid FROM seen)")]
+        self.db.executemany("DELETE FROM edges WHERE subject = ?", [(pid,) for pid in gone])
+        self.db.executemany("DELETE FROM objects WHERE pid = ?", [(pid,) for pid in gone])
+        self.db.commit()
+        return gone
+
+    # Questions
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM objects").fetchone()[0]
+
+    def __contains__(self, pid):
+        return self.db.execute("SELECT 1 FROM objects WHERE pid = ?", (pid,)).fetchone() is not None
+
+    @staticmethod
+    def _in(predicates):
+        return '({})'.format(','.join('?' * len(predicates)))
+
+    def children(self, pid, predicates=MEMBERSHIP):
+        """ PIDs that point at pid with any of predicates """
+        return [row[0] for row in self.db.execute(
+            "SELECT subject FROM edges WHERE object = ? AND predicate IN " + self._in(predicates),
+            (pid,) + tuple(predicates))]
+
+    def parents(self, pid, predicates=MEMBERSHIP):
+        return [row[0] for row in self.db.execute(
+            "SELECT object FROM edges WHERE subject = ? AND predicate IN " + self._in(predicates),
+            (pid,) + tuple(predicates))]
+
+    def descendants(self, pid, predicates=MEMBERSHIP):
+        """ Everything below pid, at any depth (each PID once, cycles are fine) """
+        return [row[0] for row in self.db.execute(
+            "WITH RECURSIVE below(pid) AS (SELECT ? UNION "
+            "SELECT edges.subject FROM edges JOIN below ON edges.object = below.pid "
+            "WHERE edges.predicate IN " + self._in(predicates) + ") "
+            "SELECT pid FROM below WHERE pid != ?", (pid,) + tuple(predicates) + (pid,))]
+
+    def ancestors(self, pid, predicates=MEMBERSHIP):
+        """ Everything above pid, at any depth """
+        return [row[0] for row in self.db.execute(
+            "WITH RECURSIVE above(pid) AS (SELECT ? UNION "
+            "SELECT edges.object FROM edges JOIN above ON edges.subject = above.pid "
+            "WHERE edges.predicate IN " + self._in(predicates) + ") "
+            "SELECT pid FROM above WHERE pid != ?", (pid,) + tuple(predicates) + (pid,))]
+
+    def models(self, pid):
+        return self.parents(pid, ('hasModel',))
+
+    def with_model(self, cmodel):
+        return self.children(cmodel, ('hasModel',))
+
+    def missing_model(self):
+        """ Objects with no hasModel at all """
+        return [row[0] for row in self.db.execute(
+            "SELECT pid FROM objects WHERE pid NOT IN (SELECT subject FROM edges WHERE predicate = 'hasModel')")]
+
+    def orphans(self, predicates=MEMBERSHIP):
+        """ (child, parent) pairs where the parent isn't in the index (deleted, or never indexed) """
+        return self.db.execute(
+            "SELECT subject, object FROM edges WHERE predicate IN " + self._in(predicates) +
+            " AND object NOT IN (SELECT pid FROM objects)", tuple(predicates)).fetchall()
+
+    def close(self):
+        self.db.close()
@@ -1,4 +1,15 @@
 # islandora7_rest/__init__.py
 # Copyright (c) 2019 The University of Kansas
+#
+# The clients (and config) are imported when first used, not here - see _lazy.py
 
-from .IslandoraClient import IslandoraClient
\ No newline at end of file
+from ._lazy import lazy_module
+
+__all__ = ['IslandoraClient', 'AsyncIslandoraClient']
+
+lazy_module(__name__, {
+    'IslandoraClient': ('.IslandoraClient', 'IslandoraClient'),
+    'AsyncIslandoraClient': ('.AsyncIslandoraClient', 'AsyncIslandoraClient'),
+    'config': ('.config', None),
+    'ku': ('.ku', None),
+})
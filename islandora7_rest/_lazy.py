@@ -0,0 +1,51 @@
+# /islandora7_rest/_lazy.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Packages that import their submodules on first use, so `import islandora7_rest` doesn't pull in
+# requests (or aiohttp) before anything asks for a client.
+#
+# IslandoraClient is both a submodule and the class in it.  Importing islandora7_rest.IslandoraClient
+# makes Python set the package attribute to the submodule, which would hide the class - so the
+# package module's __setattr__ swaps the class back in, as the old eager `from .IslandoraClient
+# import IslandoraClient` did.
+
+import importlib
+import sys
+
+from types import ModuleType
+
+
+class LazyModule(ModuleType):
+
+    def __getattr__(self, name):
+        # Only called for names not loaded yet
+        try:
+            submodule, attribute = self._lazy[name]
+        except KeyError:
+            raise AttributeError("module {!r} has no attribute {!r}".format(self.__name__, name))
+        module = importlib.import_module(submodule, self.__name__)
+        value = module if attribute is None else getattr(module, attribute)
+        setattr(self, name, value)
+        return value
+
+    def __setattr__(self, name, value):
+        lazy = self.__dict__.get('_lazy', {}).get(name)
+        if lazy and lazy[1] and isinstance(value, ModuleType) and value.__name__ == self.__name__ + lazy[0]:
+            value = getattr(value, lazy[1])
+        super(LazyModule, self).__setattr__(name, value)
+
+    def __dir__(self):
+        return sorted(set(super(LazyModule, self).__dir__()) | set(self._lazy))
+
+
+def lazy_module(name, names):
+    """
+    Turns the package `name` lazy
+
+    :param name: the package's __name__
+    :param names: {attribute: (relative submodule, name in it - or None for the submodule itself)}
+    """
+    module = sys.modules[name]
+    module._lazy = names
+    module.__class__ = LazyModule
@@ -0,0 +1,145 @@
+# /islandora7_rest/cache.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Optional response caches for IslandoraClient(cache=...)
+#
+# Caches hold the raw JSON body of get_object, get_relationships and get_datastream_info,
+# tagged with the PID, so that any change made through the client to that PID throws them out.
+# Each hit is decoded fresh, so callers can't scribble on each other's dictionaries.
+#
+# An entry past its ttl isn't simply thrown away.  islandora_rest's JSON rarely comes with an ETag or
+# Last-Modified, so entries also keep a validator - the created date and checksum of the datastream
+# they describe (RELS-EXT, for relationships), as the object profile lists them.  One fresh profile
+# then vouches for every stale entry about that object whose datastream hasn't changed.
+#
+#   MemoryCache  - LRU in a dictionary, bounded by entry count
+#   SqliteCache  - same, on disk, shared between runs (and processes, if you like)
+
+import sqlite3
+import threading
+import time
+
+from collections import namedtuple, OrderedDict
+
+
+class CacheEntry(namedtuple('CacheEntry', ['body', 'etag', 'last_modified', 'expires', 'validator'])):
+    __slots__ = ()
+
+    @property
+    def fresh(self):
+        return time.time() < self.expires
+
+
+class MemoryCache(object):
+
+    def __init__(self, maxsize=10000, ttl=300):
+        """
+
+        :param maxsize: entries kept before the least recently used go
+        :param ttl: seconds an entry is used without asking the server again
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :return: CacheEntry, possibly stale (check .fresh) - or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry[1] if entry else None
+
+    def set(self, key, tag, body, etag=None, last_modified=None, validator=None):
+        with self._lock:
+            if key in self._entries:
+                self._forget(key)
+            self._entries[key] = (tag, CacheEntry(body, etag, last_modified, time.time() + self.ttl, validator))
+            self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._forget(next(iter(self._entries)))
+
+    def invalidate(self, tag):
+        """ Drop everything cached for a PID """
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._forget(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _forget(self, key):
+        tag, _ = self._entries.pop(key)
+        keys = self._tags[tag]
+        keys.discard(key)
+        if not keys:
+            del self._tags[tag]
+
+
+class SqliteCache(object):
+
+    def __init__(self, path, maxsize=1000000, ttl=3600):
+        """
+
+        :param path: SQLite database file (created if need be)
+        :param maxsize: entries kept before the least recently used go
+        :param ttl: seconds an entry is used without asking the server again
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, tag TEXT, body BLOB, "
+                         "etag TEXT, last_modified TEXT, expires REAL, used REAL, validator TEXT)")
+        # Caches made before validators were kept
+        if 'validator' not in [row[1] for row in self._db.execute("PRAGMA table_info(cache)")]:
+            self._db.execute("ALTER TABLE cache ADD COLUMN validator TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_tag ON cache (tag)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_used ON cache (used)")
+
+    def get(self, key):
+        """
+        :return: CacheEntry, possibly stale (check .fresh) - or None
+        """
+        with self._lock:
+            row = self._db.execute("SELECT body, etag, last_modified, expires, validator FROM cache WHERE key = ?",
+                                   (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE cache SET used = ? WHERE key = ?", (time.time(), key))
+            return CacheEntry(*row)
+
+    def set(self, key, tag, body, etag=None, last_modified=None, validator=None):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO cache (key, tag, body, etag, last_modified, expires, used, "
+                             "validator) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (key, tag, body, etag, last_modified, now + self.ttl, now, validator))
+            # Counting rows isn't free, so only trim every so often
+            self._writes += 1
+            if self._writes % 100 == 0:
+                count = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+                if count > self.maxsize:
+                    self._db.execute("DELETE FROM cache WHERE key IN "
+                                     "(SELECT key FROM cache ORDER BY used LIMIT ?)", (count - self.maxsize,))
+
+    def invalidate(self, tag):
+        """ Drop everything cached for a PID """
+        with self._lock:
+            self._db.execute("DELETE FROM cache WHERE tag = ?", (tag,))
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM cache")
+
+    def close(self):
+        self._db.close()
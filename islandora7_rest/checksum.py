@@ -0,0 +1,19 @@
+# /islandora7_rest/checksum.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Fedora checksumType <-> hashlib
+
+import hashlib
+
+
+def new_hasher(checksum_type):
+    """
+    hashlib object for a Fedora checksumType (MD5, SHA-1, SHA-256, SHA-384, SHA-512)
+
+    :param checksum_type: as found in get_datastream_info()['checksumType']
+    :return: None if the type is missing or DISABLED
+    """
+    if not checksum_type or checksum_type.upper() == 'DISABLED':
+        return None
+    return hashlib.new(checksum_type.replace('-', '').lower())
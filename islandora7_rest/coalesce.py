@@ -0,0 +1,71 @@
+# /islandora7_rest/coalesce.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Single-flight: when threads ask for the same thing at the same moment, one request goes out
+# and they all get its answer.  Nothing is kept once it lands - that's what cache.py is for.
+#
+# Used by IslandoraClient(coalesce=True) for the read-only GETs.  The shared answer is the raw
+# response body, so each caller still decodes its own dictionaries.
+
+import threading
+
+
+class _Call(object):
+    __slots__ = ('done', 'result', 'error', 'tag')
+
+    def __init__(self, tag):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.tag = tag
+
+
+class SingleFlight(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        # Callers answered by someone else's request
+        self.shared = 0
+
+    def do(self, key, function, tag=None):
+        """
+        function() - unless a call for key is already running, in which case wait for that one instead.
+        Its error, if it fails, is raised to everyone who waited.
+
+        :param key: what makes two calls the same (method and URL, say)
+        :param function: no-argument callable
+        :param tag: for forget(), e.g. the PID
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call(tag)
+            else:
+                self.shared += 1
+        if leader:
+            try:
+                call.result = function()
+            except BaseException as error:
+                call.error = error
+            finally:
+                with self._lock:
+                    if self._calls.get(key) is call:
+                        del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def forget(self, tag):
+        """
+        Calls already running for tag are left to finish, but nobody new joins them -
+        after a change to an object, a request that set off before it mustn't answer for after it.
+        """
+        with self._lock:
+            for key in [key for key, call in self._calls.items() if call.tag == tag]:
+                del self._calls[key]
@@ -0,0 +1,232 @@
+# /islandora7_rest/concurrency.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Thread helpers behind the batch methods (get_objects, get_datastreams_info, ...)
+# and the read-ahead / sharded Solr generators
+
+import itertools
+import queue
+import threading
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class BatchResult(namedtuple('BatchResult', ['item', 'result', 'error'])):
+    """
+    One finished item of a batch.
+    item is what you passed in (a PID, a (pid, dsid) pair...), then either result or error.
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def imap_unordered(func, items, max_workers=8, backlog=None):
+    """
+    Runs func(item) on a thread pool and yields a BatchResult for each item as it finishes.
+    One failure doesn't stop the batch - it comes back as that item's error.
+
+    Only `backlog` items (default max_workers * 2) are pulled from `items` at a time,
+    so a generator of 200k PIDs never becomes 200k futures.
+
+    :param func: called once per item
+    :param items: any iterable
+    :param max_workers: threads in the pool
+    :param backlog: items submitted but not yet yielded
+    """
+    backlog = backlog or max_workers * 2
+    items = iter(items)
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            for item in itertools.islice(items, backlog):
+                pending[pool.submit(func, item)] = item
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    error = future.exception()
+                    yield BatchResult(item, None if error else future.result(), error)
+                for item in itertools.islice(items, len(done)):
+                    pending[pool.submit(func, item)] = item
+        finally:
+            # Caller walked away early - don't start anything that hasn't started
+            for future in pending:
+                future.cancel()
+
+
+# Marks the end of a background producer's output
+_DONE = object()
+
+
+def _put(buffer, item, stop):
+    # Blocking put that gives up once the consumer has gone away
+    while not stop.is_set():
+        try:
+            buffer.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def prefetched(iterable, depth=1):
+    """
+    Iterates `iterable` in a background thread, staying up to `depth` items ahead of the consumer.
+    Errors in the background thread are re-raised to the consumer, in order.
+
+    :param iterable: e.g. a generator of Solr pages
+    :param depth: how many items may wait in the read-ahead buffer
+    """
+    buffer = queue.Queue(maxsize=max(depth, 1))
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                if not _put(buffer, (item, None), stop):
+                    return
+            _put(buffer, (_DONE, None), stop)
+        except BaseException as error:
+            _put(buffer, (_DONE, error), stop)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def merged(factories, max_workers=8, buffer_size=1000):
+    """
+    Runs several iterables at once and yields their items interleaved, in whatever order they arrive.
+    Each factory is called (in a worker thread) to get its iterable, so nothing starts early.
+    The first error from any of them stops the lot and is re-raised to the consumer.
+
+    :param factories: list of no-argument callables returning iterables
+    :param max_workers: iterables walked at the same time
+    :param buffer_size: items that may wait for the consumer
+    """
+    work = queue.Queue()
+    for factory in factories:
+        work.put(factory)
+    buffer = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+    workers = min(max_workers, len(factories))
+
+    def run():
+        try:
+            while not stop.is_set():
+                try:
+                    factory = work.get_nowait()
+                except queue.Empty:
+                    break
+                for item in factory():
+                    if not _put(buffer, (item, None), stop):
+                        return
+            _put(buffer, (_DONE, None), stop)
+        except BaseException as error:
+            _put(buffer, (_DONE, error), stop)
+
+    for _ in range(workers):
+        threading.Thread(target=run, daemon=True).start()
+    try:
+        finished = 0
+        while finished < workers:
+            item, error = buffer.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                finished += 1
+                continue
+            yield item
+    finally:
+        stop.set()
+
+
+def pipelined(items, stages, queue_size=None):
+    """
+    Runs each item through a series of stages, each with its own threads, so later stages for one
+    item overlap with earlier stages for the next.  Stages are joined by bounded queues: a slow
+    stage holds the ones before it up rather than letting work pile up in memory.
+
+    Each stage function gets what the one before returned (the first gets the item itself).
+    A failure takes that item out of the pipeline as its BatchResult error; the last stage's
+    return value is the result.  Order is NOT preserved.
+
+    :param items: any iterable, read as the first stage needs it
+    :param stages: list of (function, threads)
+    :param queue_size: items waiting in front of each stage, defaults to twice its threads
+    :return: generator of BatchResult
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size or threads * 2) for function, threads in stages]
+    output = queue.Queue(maxsize=queue_size or stages[-1][1] * 2)
+    remaining = [threads for function, threads in stages]
+    lock = threading.Lock()
+
+    def feed():
+        try:
+            for item in items:
+                if not _put(queues[0], (item, item), stop):
+                    return
+        except BaseException as error:
+            _put(output, (_DONE, error), stop)
+        for _ in range(stages[0][1]):
+            _put(queues[0], _DONE, stop)
+
+    def work(index):
+        function = stages[index][0]
+        last = index == len(stages) - 1
+        while not stop.is_set():
+            try:
+                entry = queues[index].get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if entry is _DONE:
+                break
+            item, value = entry
+            try:
+                value = function(value)
+            except Exception as error:
+                _put(output, BatchResult(item, None, error), stop)
+                continue
+            if last:
+                _put(output, BatchResult(item, value, None), stop)
+            else:
+                _put(queues[index + 1], (item, value), stop)
+        with lock:
+            remaining[index] -= 1
+            finished = remaining[index] == 0
+        if finished:
+            # Everything this stage will ever pass on has gone - tell the next one
+            if last:
+                _put(output, (_DONE, None), stop)
+            else:
+                for _ in range(stages[index + 1][1]):
+                    _put(queues[index + 1], _DONE, stop)
+
+    threading.Thread(target=feed, daemon=True).start()
+    for index, (function, threads) in enumerate(stages):
+        for _ in range(threads):
+            threading.Thread(target=work, args=(index,), daemon=True).start()
+    try:
+        while True:
+            entry = output.get()
+            if entry[0] is _DONE:
+                if entry[1] is not None:
+                    raise entry[1]
+                return
+            yield entry
+    finally:
+        stop.set()
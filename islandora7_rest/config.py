@@ -8,13 +8,38 @@
 #                           user=ISLANDORA_USER,
 #                           token=ISLANDORA_TOKEN)
 
+# Nothing is read until one of the settings is first used - then the .env file
+# (next to the script being run, as always) is loaded once and the values kept.
+# Call load() yourself to read a different .env.
 
-import os, sys
-from dotenv import load_dotenv
+import os
+import sys
 
-load_dotenv(os.path.join(sys.path[0], '.env'))
+DEFAULTS = {
+    'ISLANDORA_REST': "http://localhost:8000/islandora/rest/",
+    'ISLANDORA_USER': "admin",
+    'ISLANDORA_TOKEN': "password",
+}
 
-ISLANDORA_REST = os.getenv("ISLANDORA_REST",
-                           "http://localhost:8000/islandora/rest/")
-ISLANDORA_USER = os.getenv("ISLANDORA_USER", "admin")
-ISLANDORA_TOKEN = os.getenv("ISLANDORA_TOKEN", "password")
\ No newline at end of file
+__all__ = list(DEFAULTS)
+
+
+def load(dotenv_path=None):
+    """
+    Reads .env (unless the environment already has a setting) and sets the module's values
+
+    :param dotenv_path: defaults to .env in the running script's directory
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path or os.path.join(sys.path[0], '.env'))
+    for name, default in DEFAULTS.items():
+        globals()[name] = os.getenv(name, default)
+
+
+def __getattr__(name):
+    # Only called while the settings aren't loaded yet
+    if name in DEFAULTS:
+        load()
+        return globals()[name]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,61 @@
+# /islandora7_rest/cursor.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Where a solr_generator walk has got to, as something you can keep.
+#
+# cursor_mark is the Solr cursorMark of the page being read and offset is how many of that
+# page's docs have been handed over, so a resumed walk starts on exactly the next document.
+
+import json
+import os
+
+
+class SolrCursor(object):
+
+    def __init__(self, query="*:*", params=None, cursor_mark='*', offset=0, count=0, done=False):
+        """
+
+        :param query: Solr query
+        :param params: the other Solr params (rows, sort, fl, fq...) - cursorMark not included
+        :param cursor_mark: cursorMark of the current page
+        :param offset: docs of the current page already handed over
+        :param count: docs handed over in total
+        :param done: the walk reached the end
+        """
+        self.query = query
+        self.params = dict(params or {})
+        self.cursor_mark = cursor_mark
+        self.offset = offset
+        self.count = count
+        self.done = done
+
+    def to_dict(self):
+        return {
+            'query': self.query,
+            'params': self.params,
+            'cursor_mark': self.cursor_mark,
+            'offset': self.offset,
+            'count': self.count,
+            'done': self.done,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(**state)
+
+    def save(self, path):
+        """ Written to a temporary file and renamed, so a crash mid-save leaves the old checkpoint """
+        temporary = path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as checkpoint:
+            json.dump(self.to_dict(), checkpoint)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as checkpoint:
+            return cls.from_dict(json.load(checkpoint))
+
+    def __repr__(self):
+        return 'SolrCursor({!r}, cursor_mark={!r}, offset={}, count={}, done={})'.format(
+            self.query, self.cursor_mark, self.offset, self.count, self.done)
@@ -0,0 +1,69 @@
+# /islandora7_rest/journal.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Progress journal for long bulk jobs: one JSON line per finished step, appended and flushed
+# as it happens.  Open the same file on a rerun and whatever finished last time is skipped.
+# A line cut off by a crash is ignored (and ended, so the next entry starts on a line of its own).
+
+import json
+import os
+import threading
+
+
+class Journal(object):
+
+    def __init__(self, path):
+        """
+
+        :param path: journal file, created if need be
+        """
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        cut_off = False
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as previous:
+                for line in previous:
+                    cut_off = not line.endswith('\n')
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry['key']] = entry
+        self._handle = open(path, 'a', encoding='utf-8')
+        if cut_off:
+            # End the cut-off line, or the next entry would be appended onto it and lost with it
+            self._handle.write('\n')
+            self._handle.flush()
+
+    def is_done(self, key):
+        entry = self.entries.get(key)
+        return entry is not None and entry.get('status') == 'done'
+
+    def get(self, key):
+        """ The last entry recorded for key, or None """
+        return self.entries.get(key)
+
+    def record(self, key, status='done', **details):
+        """
+        :param key: string identifying the step, e.g. 'regen OCR islandora:5'
+        :param status: 'done' is skipped on a rerun, anything else ('failed'...) is tried again
+        :param details: anything else worth keeping, JSON-able
+        """
+        entry = dict(details, key=key, status=status)
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            self.entries[key] = entry
+            self._handle.write(line)
+            self._handle.flush()
+
+    def close(self):
+        with self._lock:
+            self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
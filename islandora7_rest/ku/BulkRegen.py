@@ -0,0 +1,132 @@
+# /islandora7_rest/ku/BulkRegen.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# regen / reindex across a whole collection with IslandoraClientKU.
+#
+# Each DSID gets its own lane with its own limit (OCR is far heavier on the server than DC),
+# under one overall cap on requests in flight.  PIDs are read as the lanes need them, so a
+# Solr generator of millions of PIDs is fine.  With a journal, finished (pid, DSID) pairs are
+# skipped when an interrupted run is started again.
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from ..concurrency import BatchResult
+from ..journal import Journal
+
+
+class BulkRegen(object):
+
+    def __init__(self, client, journal=None, max_workers=8, dsid_limits=None, queue_size=1000):
+        """
+
+        :param client: IslandoraClientKU
+        :param journal: path to a progress journal (optional)
+        :param max_workers: requests in flight, across all DSIDs
+        :param dsid_limits: requests in flight per DSID, e.g. {'OCR': 2, 'PDF': 2} -
+            DSIDs not listed are only held to max_workers
+        :param queue_size: PIDs waiting in any one lane before we stop reading ahead
+        """
+        # A lane that can never run anything would keep the scheduler waiting on it forever
+        if max_workers < 1:
+            raise Exception("max_workers must be at least 1")
+        for dsid, limit in (dsid_limits or {}).items():
+            if limit < 1:
+                raise Exception("dsid_limits[{!r}] must be at least 1 - leave the DSID out instead".format(dsid))
+        self.client = client
+        self.journal = Journal(journal) if journal else None
+        self.max_workers = max_workers
+        self.dsid_limits = dsid_limits or {}
+        self.queue_size = queue_size
+
+    @staticmethod
+    def solr_pids(islandora_client, query="*:*", **params):
+        """
+        PIDs from a Solr query, to feed regen() / reindex()
+
+        :param islandora_client: an IslandoraClient (Solr lives on v1/, not v1ku/)
+        """
+        for doc in islandora_client.solr_generator(query, **params):
+            yield doc['PID']
+
+    def regen(self, pids, dsids=('DC',), **kwargs):
+        """
+
+        :param pids: iterable of PIDs
+        :param dsids: list of DSIDs, or a dictionary of {DSID: regen kwargs} for per-DSID flags
+            like {'OCR': {'language': 'spa', 'force_children': True}, 'DC': {}}
+        :param kwargs: regen flags for every DSID
+        :return: generator of BatchResult, item is (pid, dsid)
+        """
+        if not isinstance(dsids, dict):
+            dsids = dict((dsid, {}) for dsid in dsids)
+        lanes = {}
+        for dsid, flags in dsids.items():
+            lanes[dsid] = self._regen_one(dsid, dict(kwargs, **flags))
+        return self._run(pids, lanes, 'regen')
+
+    def _regen_one(self, dsid, flags):
+        return lambda pid: self.client.regen(pid, dsid, **flags)
+
+    def reindex(self, pids, **kwargs):
+        """
+
+        :param pids: iterable of PIDs
+        :return: generator of BatchResult, item is (pid, 'reindex')
+        """
+        return self._run(pids, {'reindex': lambda pid: self.client.reindex(pid, **kwargs)}, 'reindex')
+
+    def _run(self, pids, lanes, action):
+        pids = iter(pids)
+        waiting = dict((lane, deque()) for lane in lanes)
+        running = dict((lane, 0) for lane in lanes)
+        futures = {}
+        exhausted = False
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                # Read ahead until some lane has plenty to do, without letting a slow lane's backlog grow forever
+                while not exhausted and min(len(queue) for queue in waiting.values()) < self.max_workers \
+                        and max(len(queue) for queue in waiting.values()) < self.queue_size:
+                    pid = next(pids, None)
+                    if pid is None:
+                        exhausted = True
+                        break
+                    for lane, queue in waiting.items():
+                        if not (self.journal and self.journal.is_done(self._key(action, lane, pid))):
+                            queue.append(pid)
+
+                # Hand out work round-robin, within the lane and overall limits
+                dispatched = True
+                while dispatched and len(futures) < self.max_workers:
+                    dispatched = False
+                    for lane, queue in waiting.items():
+                        if queue and running[lane] < self.dsid_limits.get(lane, self.max_workers) \
+                                and len(futures) < self.max_workers:
+                            pid = queue.popleft()
+                            futures[pool.submit(lanes[lane], pid)] = (pid, lane)
+                            running[lane] += 1
+                            dispatched = True
+
+                if not futures:
+                    if exhausted and not any(waiting.values()):
+                        return
+                    continue
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pid, lane = futures.pop(future)
+                    running[lane] -= 1
+                    error = future.exception()
+                    if self.journal:
+                        if error is None:
+                            self.journal.record(self._key(action, lane, pid), pid=pid, dsid=lane)
+                        else:
+                            self.journal.record(self._key(action, lane, pid), 'failed', pid=pid, dsid=lane,
+                                                error=str(error))
+                    yield BatchResult((pid, lane), None if error else future.result(), error)
+
+    @staticmethod
+    def _key(action, lane, pid):
+        return '{} {} {}'.format(action, lane, pid)
@@ -1,22 +1,10 @@
-import requests
+from ..IslandoraSession import IslandoraSession
 
 
 # Similar to IslandoraClient, reflecting some KU local "v1ku" custom endpoints
 
-class IslandoraClientKU(requests.Session):
-
-    def __init__(self, rest_url=None, user=None, token=None):
-        super(__class__, self).__init__()
-        self.url_base = rest_url
-        if self.url_base[-1] != "/":
-            self.url_base = rest_url + "/"
-        if user and token:
-            self.auth = (user, token)
-
-    def request(self, method, url, **kwargs):
-        modified_url = self.url_base + 'v1ku/' + url
-        return super(__class__, self).request(method, modified_url,
-                                              **kwargs)
+class IslandoraClientKU(IslandoraSession):
+    api_path = 'v1ku/'
 
     # **kwargs here could be DSID-specific flags, like 
     # language='spa' for OCR, or force_children=True for OCR/PDF
@@ -30,11 +18,18 @@ class IslandoraClientKU(requests.Session):
         return response
 
     # returns raw PREMIS XML as a string
-    
-    def premis(self, pid, **kwargs):
+    # or, streaming, a file-like object to parse as it arrives (close it when done)
+
+    def premis(self, pid, streaming=False, **kwargs):
         if not pid:
             raise Exception("Missing PID")
         url = "object/{}/premis".format(pid)
+        if streaming:
+            response = self.get(url, params=kwargs, stream=True)
+            response.raise_for_status()
+            # gzip'd or not, the parser wants XML
+            response.raw.decode_content = True
+            return response.raw
         response = self.get(url, params=kwargs)
         response.raise_for_status()
         return response.content
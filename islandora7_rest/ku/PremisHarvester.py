@@ -0,0 +1,182 @@
+# /islandora7_rest/ku/PremisHarvester.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# PREMIS for a whole repository, for fixity audits.
+#
+# IslandoraClientKU.premis is fetched for many PIDs at once, and each response is parsed with
+# iterparse as it comes off the socket - every element is thrown away once read, so a PREMIS
+# document with thousands of events never sits in memory as a tree.  What's kept is a small
+# record per event and per fixity value, appended to a JSON lines file or an SQLite database.
+#
+#   with PremisHarvester(ku_client, SqliteStore("premis.db"), journal="premis-journal.jsonl") as harvester:
+#       for batch_result in harvester.harvest(pids):
+#           ...
+#
+# PREMIS 2 and 3 both work - elements are matched by name, whatever the namespace.
+
+import json
+import sqlite3
+
+from collections import namedtuple
+from xml.etree.ElementTree import iterparse
+
+from ..concurrency import imap_unordered
+from ..journal import Journal
+
+
+class Event(namedtuple('Event', ['pid', 'identifier', 'type', 'datetime', 'detail', 'outcome', 'object'])):
+    """ A PREMIS event - object is the linked object identifier (info:fedora/{pid}/{dsid}) """
+    __slots__ = ()
+
+
+class Fixity(namedtuple('Fixity', ['pid', 'object', 'algorithm', 'digest', 'size'])):
+    """ A message digest from a PREMIS object's characteristics """
+    __slots__ = ()
+
+
+def _name(element):
+    return element.tag.rsplit('}', 1)[-1]
+
+
+def _find(element, *names):
+    # Text of the first descendant with one of these names
+    for child in element.iter():
+        if _name(child) in names:
+            return child.text
+    return None
+
+
+def parse_premis(source, pid):
+    """
+    Events and fixity values from a PREMIS document, as they're read.
+
+    :param source: a file-like object (premis(pid, streaming=True)) or a file name
+    :param pid: for the records
+    :return: generator of Event and Fixity
+    """
+    root = None
+    for event, element in iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            continue
+        name = _name(element)
+        if name == 'event':
+            yield Event(pid,
+                        _find(element, 'eventIdentifierValue'),
+                        _find(element, 'eventType'),
+                        _find(element, 'eventDateTime'),
+                        _find(element, 'eventDetail'),
+                        _find(element, 'eventOutcome'),
+                        _find(element, 'linkingObjectIdentifierValue'))
+        elif name == 'object':
+            identifier = _find(element, 'objectIdentifierValue')
+            size = _find(element, 'size')
+            for fixity in element.iter():
+                if _name(fixity) == 'fixity':
+                    yield Fixity(pid, identifier, _find(fixity, 'messageDigestAlgorithm'),
+                                 _find(fixity, 'messageDigest'), int(size) if size else None)
+        else:
+            continue
+        # Done with it - and drop it from the root, or the document builds up there after all
+        element.clear()
+        if root is not None:
+            root.clear()
+
+
+class JsonlStore(object):
+    """ One JSON line per record, {"record": "event" | "fixity", ...fields}, appended """
+
+    def __init__(self, path):
+        self._handle = open(path, 'a', encoding='utf-8')
+
+    def write(self, records):
+        for record in records:
+            data = record._asdict()
+            data['record'] = 'event' if isinstance(record, Event) else 'fixity'
+            self._handle.write(json.dumps(data) + '\n')
+        self._handle.flush()
+
+    def close(self):
+        self._handle.close()
+
+
+class SqliteStore(object):
+    """ Tables events and fixity, columns as Event and Fixity """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS events (pid TEXT, identifier TEXT, type TEXT, datetime TEXT, detail TEXT,
+                                               outcome TEXT, object TEXT);
+            CREATE INDEX IF NOT EXISTS events_pid ON events (pid);
+            CREATE TABLE IF NOT EXISTS fixity (pid TEXT, object TEXT, algorithm TEXT, digest TEXT, size INTEGER);
+            CREATE INDEX IF NOT EXISTS fixity_pid ON fixity (pid);
+        """)
+
+    def write(self, records):
+        self.db.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            [record for record in records if isinstance(record, Event)])
+        self.db.executemany("INSERT INTO fixity VALUES (?, ?, ?, ?, ?)",
+                            [record for record in records if isinstance(record, Fixity)])
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+class PremisHarvester(object):
+
+    def __init__(self, client, store, journal=None, max_workers=None):
+        """
+
+        :param client: IslandoraClientKU
+        :param store: JsonlStore or SqliteStore (anything with write(records) and close())
+        :param journal: path to a progress journal (optional) - PIDs harvested already are skipped
+        :param max_workers: PIDs fetched at once, defaults to the client's max_workers
+        """
+        self.client = client
+        self.store = store
+        self.journal = Journal(journal) if journal else None
+        self.max_workers = max_workers or client.max_workers
+
+    def _fetch(self, pid):
+        source = self.client.premis(pid, streaming=True)
+        try:
+            return list(parse_premis(source, pid))
+        finally:
+            source.close()
+
+    def harvest(self, pids):
+        """
+
+        :param pids: iterable of PIDs
+        :return: generator of BatchResult, item is the PID and result is (events, fixity values) stored
+        """
+        pids = (pid for pid in pids if not (self.journal and self.journal.is_done('premis ' + pid)))
+        for batch_result in imap_unordered(self._fetch, pids, self.max_workers):
+            pid = batch_result.item
+            if not batch_result.ok:
+                if self.journal:
+                    self.journal.record('premis ' + pid, 'failed', pid=pid, error=str(batch_result.error))
+                yield batch_result
+                continue
+            # Written from this thread only, so the stores needn't be thread-safe
+            records = batch_result.result
+            self.store.write(records)
+            events = sum(1 for record in records if isinstance(record, Event))
+            if self.journal:
+                self.journal.record('premis ' + pid, pid=pid, events=events, fixity=len(records) - events)
+            yield batch_result._replace(result=(events, len(records) - events))
+
+    def close(self):
+        self.store.close()
+        if self.journal:
+            self.journal.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1 +1,9 @@
-from .IslandoraClientKU import IslandoraClientKU
+from .._lazy import lazy_module
+
+__all__ = ['IslandoraClientKU', 'BulkRegen', 'PremisHarvester']
+
+lazy_module(__name__, {
+    'IslandoraClientKU': ('.IslandoraClientKU', 'IslandoraClientKU'),
+    'BulkRegen': ('.BulkRegen', 'BulkRegen'),
+    'PremisHarvester': ('.PremisHarvester', 'PremisHarvester'),
+})
@@ -0,0 +1,193 @@
+# /islandora7_rest/metrics.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Where the time goes.  Hand a Metrics to either client (metrics=...) and every request is
+# counted per endpoint template - object/{pid}/datastream/{dsid} rather than each PID:
+# latency histogram, bytes each way, errors, retries.
+#
+#   metrics.snapshot()    - plain dictionary
+#   metrics.prometheus()  - Prometheus text exposition format, for a scrape endpoint or a textfile collector
+#   metrics.before_request / after_request - lists of hooks, called around each attempt
+
+import re
+import threading
+import weakref
+
+# Most specific first
+_TEMPLATES = [
+    (re.compile(r'^object/[^/]+/datastream/[^/?]+'), 'object/{pid}/datastream/{dsid}'),
+    (re.compile(r'^object/[^/]+/datastream/?$'), 'object/{pid}/datastream'),
+    (re.compile(r'^object/[^/]+/relationship'), 'object/{pid}/relationship'),
+    (re.compile(r'^object/[^/]+/premis'), 'object/{pid}/premis'),
+    (re.compile(r'^object/[^/?]+'), 'object/{pid}'),
+    (re.compile(r'^solr/'), 'solr/{query}'),
+    (re.compile(r'^regen/[^/]+/[^/?]+'), 'regen/{pid}/{dsid}'),
+    (re.compile(r'^reindex/[^/?]+'), 'reindex/{pid}'),
+]
+
+# Latency histogram bucket upper bounds, seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def endpoint_template(api_path, url):
+    """
+    'v1/', 'object/islandora:1/datastream/OBJ' -> 'v1/object/{pid}/datastream/{dsid}'
+    """
+    for pattern, template in _TEMPLATES:
+        if pattern.match(url):
+            return api_path + template
+    return api_path + url.split('?')[0]
+
+
+class _Endpoint(object):
+    __slots__ = ('requests', 'errors', 'retries', 'bytes_sent', 'bytes_received', 'latency_sum', 'buckets',
+                 'statuses')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.statuses = {}
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'retries': self.retries,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'latency_sum': self.latency_sum,
+            'latency_buckets': dict(zip([str(bound) for bound in BUCKETS] + ['+Inf'], self.buckets)),
+            'statuses': dict(self.statuses),
+        }
+
+
+class Metrics(object):
+
+    def __init__(self):
+        self.before_request = []
+        self.after_request = []
+        self._endpoints = {}
+        self._sessions = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def attach(self, session):
+        """
+        Remember a client, so its connection pools show up in snapshot() - held weakly, so a long-lived
+        Metrics shared across short-lived clients doesn't keep them alive
+        """
+        self._sessions.add(session)
+
+    def _endpoint(self, endpoint):
+        if endpoint not in self._endpoints:
+            self._endpoints[endpoint] = _Endpoint()
+        return self._endpoints[endpoint]
+
+    def record(self, endpoint, method, latency, status=None, error=None, bytes_sent=0, bytes_received=0,
+               retry=False):
+        """
+        One attempt at a request.
+
+        :param endpoint: from endpoint_template()
+        :param method:
+        :param latency: seconds
+        :param status: HTTP status, None if there was no response
+        :param error: the exception, if there was no response
+        :param bytes_sent: request body size, if known
+        :param bytes_received: response body size, if known
+        :param retry: this attempt is being retried
+        """
+        bucket = 0
+        while bucket < len(BUCKETS) and latency > BUCKETS[bucket]:
+            bucket += 1
+        with self._lock:
+            counts = self._endpoint(endpoint)
+            counts.requests += 1
+            counts.latency_sum += latency
+            counts.buckets[bucket] += 1
+            counts.bytes_sent += bytes_sent
+            counts.bytes_received += bytes_received
+            if retry:
+                counts.retries += 1
+            if error is not None or (status is not None and status >= 400):
+                counts.errors += 1
+            key = str(status) if status is not None else type(error).__name__
+            counts.statuses[key] = counts.statuses.get(key, 0) + 1
+
+    def connections(self):
+        """
+        Connection reuse, from urllib3's pools: requests made vs connections opened per host
+        """
+        pools = {}
+        for session in list(self._sessions):
+            for adapter in set(session.adapters.values()):
+                manager = getattr(adapter, 'poolmanager', None)
+                if manager is None:
+                    continue
+                for key in list(manager.pools.keys()):
+                    pool = manager.pools.get(key)
+                    if pool is None:
+                        continue
+                    name = '{}://{}:{}'.format(pool.scheme, pool.host, pool.port)
+                    pools[name] = {
+                        'connections_opened': pool.num_connections,
+                        'requests': pool.num_requests,
+                        'reused': max(0, pool.num_requests - pool.num_connections),
+                    }
+        return pools
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = dict((endpoint, counts.as_dict()) for endpoint, counts in self._endpoints.items())
+        return {
+            'endpoints': endpoints,
+            'connections': self.connections(),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def prometheus(self, prefix='islandora_rest'):
+        """
+        Everything in snapshot(), in the Prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, help_text))
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+
+        metric('request_duration_seconds', 'histogram', 'Request latency by endpoint template')
+        for endpoint, counts in sorted(snapshot['endpoints'].items()):
+            running = 0
+            for bound, count in counts['latency_buckets'].items():
+                running += count
+                lines.append('{}_request_duration_seconds_bucket{{endpoint="{}",le="{}"}} {}'.format(
+                    prefix, endpoint, bound, running))
+            lines.append('{}_request_duration_seconds_sum{{endpoint="{}"}} {}'.format(
+                prefix, endpoint, counts['latency_sum']))
+            lines.append('{}_request_duration_seconds_count{{endpoint="{}"}} {}'.format(
+                prefix, endpoint, counts['requests']))
+        for name, help_text in (('errors', 'Failed requests'), ('retries', 'Retried requests'),
+                                ('bytes_sent', 'Request body bytes'), ('bytes_received', 'Response body bytes')):
+            metric(name + '_total', 'counter', help_text)
+            for endpoint, counts in sorted(snapshot['endpoints'].items()):
+                lines.append('{}_{}_total{{endpoint="{}"}} {}'.format(prefix, name, endpoint, counts[name]))
+        metric('responses_total', 'counter', 'Attempts by HTTP status, or exception name if there was no response')
+        for endpoint, counts in sorted(snapshot['endpoints'].items()):
+            for status, count in sorted(counts['statuses'].items()):
+                lines.append('{}_responses_total{{endpoint="{}",status="{}"}} {}'.format(prefix, endpoint, status, count))
+        metric('connections_opened_total', 'counter', 'Connections opened per pool')
+        for pool, counts in sorted(snapshot['connections'].items()):
+            lines.append('{}_connections_opened_total{{pool="{}"}} {}'.format(prefix, pool, counts['connections_opened']))
+        metric('pool_requests_total', 'counter', 'Requests sent per pool')
+        for pool, counts in sorted(snapshot['connections'].items()):
+            lines.append('{}_pool_requests_total{{pool="{}"}} {}'.format(prefix, pool, counts['requests']))
+        return '\n'.join(lines) + '\n'
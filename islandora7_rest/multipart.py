@@ -0,0 +1,128 @@
+# /islandora7_rest/multipart.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# A multipart/form-data body that's read, not built.
+#
+# requests' own multipart encoder reads the whole file into one bytes object before sending.
+# MultipartUpload hands requests a file-like object instead, so the file goes out in
+# chunk_size pieces.  It hashes the file as it goes, and adds the result as a 'checksum'
+# field after the file part (PHP parses the whole body before Drupal looks at it,
+# so field order doesn't matter to islandora_rest).
+
+import os
+import uuid
+
+from .checksum import new_hasher
+
+
+def _field(boundary, name, value):
+    return ('--{}\r\n'
+            'Content-Disposition: form-data; name="{}"\r\n\r\n'
+            '{}\r\n').format(boundary, name, value).encode('utf-8')
+
+
+class MultipartUpload(object):
+
+    def __init__(self, fields, source, filename='file', size=None, checksum_type=None, chunk_size=1048576,
+                 progress=None):
+        """
+
+        :param fields: dictionary of form fields
+        :param source: a file name, a readable file-like object, or an iterable of bytes
+        :param filename: file name given for the file part
+        :param size: bytes in source, if you know it and it isn't a file name or seekable file
+        :param checksum_type: Fedora checksumType to compute while sending (MD5, SHA-1, ...)
+        :param chunk_size: bytes read from source at a time
+        :param progress: called as progress(bytes_sent, total_bytes_or_None) for each chunk
+        """
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.hasher = new_hasher(checksum_type)
+        self._owns_source = False
+
+        if isinstance(source, (str, os.PathLike)):
+            size = os.path.getsize(source)
+            filename = os.path.basename(source)
+            source = open(source, 'rb')
+            self._owns_source = True
+        elif isinstance(getattr(source, 'name', None), str):
+            filename = os.path.basename(source.name)
+        if size is None and hasattr(source, 'seek') and hasattr(source, 'tell'):
+            try:
+                position = source.tell()
+                size = source.seek(0, os.SEEK_END) - position
+                source.seek(position)
+            except OSError:
+                size = None
+        self.source = source
+        self.size = size
+        if hasattr(source, 'read'):
+            self._read = source.read
+        else:
+            chunks = iter(source)
+            self._read = lambda size: next(chunks, b'')
+
+        self._head = b''.join(_field(self.boundary, name, value) for name, value in fields.items())
+        self._head += ('--{}\r\n'
+                       'Content-Disposition: form-data; name="file"; filename="{}"\r\n'
+                       'Content-Type: application/octet-stream\r\n\r\n').format(self.boundary, filename).encode('utf-8')
+        self._pending = memoryview(self._head)
+        self._sent = 0
+        self._done = False
+
+        # requests looks for .len to send a Content-Length; without it the body goes chunked
+        if size is not None:
+            digest_placeholder = '0' * (self.hasher.digest_size * 2) if self.hasher else None
+            self.len = len(self._head) + size + len(self._tail(digest_placeholder))
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary={}'.format(self.boundary)
+
+    @property
+    def checksum(self):
+        """ Hex digest of the file, once it's all been sent """
+        return self.hasher.hexdigest() if self.hasher and self._done else None
+
+    def _tail(self, checksum):
+        tail = b'\r\n'
+        if checksum is not None:
+            tail += _field(self.boundary, 'checksum', checksum)
+        return tail + '--{}--\r\n'.format(self.boundary).encode('utf-8')
+
+    def _next_chunk(self):
+        chunk = self._read(self.chunk_size)
+        if not chunk:
+            self._done = True
+            self.close()
+            return self._tail(self.hasher.hexdigest() if self.hasher else None)
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if self.hasher:
+            self.hasher.update(chunk)
+        self._sent += len(chunk)
+        if self.progress:
+            self.progress(self._sent, self.size)
+        return chunk
+
+    def read(self, size=-1):
+        while not self._pending and not self._done:
+            self._pending = memoryview(self._next_chunk())
+        if size is None or size < 0:
+            size = len(self._pending)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data.tobytes()
+
+    def __iter__(self):
+        # Used by requests when the size is unknown - sent with chunked Transfer-Encoding
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        if self._owns_source and not self.source.closed:
+            self.source.close()
@@ -0,0 +1,247 @@
+# /islandora7_rest/results.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Compact alternatives to the decoded-JSON dictionaries, for jobs that keep millions of results around.
+#
+# A dictionary per Solr doc costs a hash table each; these are classes with __slots__, so a doc is
+# one small fixed-size object and its field names are stored once, on the class.  Ask for them with
+# typed=True on solr_generator, get_object, get_datastream_info and get_relationships - plain
+# dictionaries are still the default.
+#
+# collect() goes further and keeps a whole iteration as columns: an int or float array where every
+# value fits, a list otherwise.
+
+import keyword
+import re
+import sys
+import threading
+
+from array import array
+
+
+class Result(object):
+    # Field names (as in the JSON) and attribute names (valid identifiers), in the same order
+    __slots__ = ()
+    _keys = ()
+    _attributes = ()
+
+    def __init__(self, *values):
+        for attribute, value in zip(self._attributes, values):
+            setattr(self, attribute, value)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(*(data.get(key) for key in cls._keys))
+
+    def to_dict(self):
+        return dict((key, getattr(self, attribute)) for key, attribute in zip(self._keys, self._attributes))
+
+    # Enough of the dictionary interface that code written for the dictionaries mostly carries on working
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self._attributes[self._keys.index(key)])
+        except ValueError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return key in self._keys and self[key] is not None
+
+    def keys(self):
+        return [key for key in self._keys if self[key] is not None]
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, attribute) == getattr(other, attribute) for attribute in self._attributes)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(attribute, getattr(self, attribute)) for attribute in self._attributes))
+
+
+def _attribute(key):
+    # Solr field names like dc.title or RELS-EXT... aren't Python identifiers
+    name = re.sub(r'\W', '_', key)
+    if not name or name[0].isdigit() or keyword.iskeyword(name):
+        name = '_' + name
+    return sys.intern(name)
+
+
+def result_type(name, keys):
+    """
+    A Result class for these field names
+
+    :param name: class name
+    :param keys: field names, as in the JSON
+    """
+    keys = tuple(sys.intern(key) for key in keys)
+    attributes = []
+    for key in keys:
+        attribute = _attribute(key)
+        while attribute in attributes:
+            attribute += '_'
+        attributes.append(attribute)
+    return type(name, (Result,), {'__slots__': tuple(attributes), '_keys': keys, '_attributes': tuple(attributes)})
+
+
+# Solr docs - one class per distinct set of fields, made the first time it's seen
+_solr_types = {}
+_solr_types_lock = threading.Lock()
+
+
+def solr_doc(doc):
+    """ A Solr doc dictionary as a SolrDoc (its class depends on which fields it has) """
+    keys = tuple(doc)
+    doc_type = _solr_types.get(keys)
+    if doc_type is None:
+        with _solr_types_lock:
+            doc_type = _solr_types.get(keys) or result_type('SolrDoc', keys)
+            _solr_types[keys] = doc_type
+    return doc_type(*doc.values())
+
+
+class Relationship(Result):
+    """ One get_relationships result, flattened """
+    __slots__ = ('namespace', 'predicate', 'object', 'literal')
+    _keys = _attributes = __slots__
+
+    @classmethod
+    def from_dict(cls, data):
+        predicate = data.get('predicate') or {}
+        object = data.get('object') or {}
+        namespace = predicate.get('namespace')
+        return cls(sys.intern(namespace) if namespace else namespace,
+                   sys.intern(predicate.get('value') or ''),
+                   object.get('value'),
+                   bool(object.get('literal')))
+
+    def to_dict(self):
+        """ Back to the shape get_relationships returns """
+        return {
+            'predicate': {'value': self.predicate, 'namespace': self.namespace},
+            'object': {'value': self.object, 'literal': self.literal},
+        }
+
+
+_DATASTREAM_KEYS = ('dsid', 'label', 'state', 'size', 'mimeType', 'controlGroup', 'created', 'versionable',
+                    'checksumType', 'checksum', 'formatURI', 'location')
+
+
+class DatastreamInfo(result_type('DatastreamInfo', _DATASTREAM_KEYS)):
+    """ get_datastream_info, or one of an object profile's datastreams """
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        values = [data.get(key) for key in cls._keys]
+        for position in (2, 4, 5, 8):
+            # state, mimeType, controlGroup, checksumType - a few distinct values, shared
+            if isinstance(values[position], str):
+                values[position] = sys.intern(values[position])
+        return cls(*values)
+
+
+class ObjectProfile(result_type('ObjectProfile', ('pid', 'label', 'owner', 'models', 'state', 'created',
+                                                  'modified', 'datastreams'))):
+    """ get_object - models is a tuple, datastreams a tuple of DatastreamInfo """
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('pid'), data.get('label'), data.get('owner'),
+                   tuple(sys.intern(model) for model in data.get('models') or ()),
+                   data.get('state'), data.get('created'), data.get('modified'),
+                   tuple(DatastreamInfo.from_dict(info) for info in data.get('datastreams') or ()))
+
+    def to_dict(self):
+        data = Result.to_dict(self)
+        data['models'] = list(self.models)
+        data['datastreams'] = [info.to_dict() for info in self.datastreams]
+        return data
+
+
+class Columns(object):
+    """
+    Results kept column by column - see collect()
+    """
+
+    def __init__(self, names=None):
+        self.names = list(names or [])
+        self.columns = dict((name, array('q')) for name in self.names)
+        self.length = 0
+
+    def append(self, row):
+        """ :param row: a dictionary (or Result) - fields not seen before get a new column """
+        for name in row.keys():
+            if name not in self.columns:
+                self.names.append(name)
+                # Earlier rows didn't have it
+                self.columns[name] = [None] * self.length if self.length else array('q')
+        for name in self.names:
+            value = row.get(name)
+            column = self.columns[name]
+            if isinstance(column, array):
+                try:
+                    if type(value) is int or (type(value) is float and column.typecode == 'd'):
+                        column.append(value)
+                        continue
+                    if type(value) is float:
+                        column = self.columns[name] = array('d', column)
+                        column.append(value)
+                        continue
+                except OverflowError:
+                    pass
+                column = self.columns[name] = list(column)
+            if isinstance(value, list):
+                # Multi-valued fields - a tuple is smaller, and hashable
+                value = tuple(value)
+            column.append(value)
+        self.length += 1
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def rows(self):
+        """ Tuples in the order of names """
+        return zip(*(self.columns[name] for name in self.names))
+
+    def to_pandas(self):
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError("to_pandas needs pandas: pip install islandora7-rest[pandas]")
+        return pandas.DataFrame(self.columns, columns=self.names)
+
+    def to_arrow(self):
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("to_arrow needs pyarrow: pip install islandora7-rest[arrow]")
+        return pyarrow.table(dict((name, list(self.columns[name])) for name in self.names))
+
+
+def collect(results, names=None):
+    """
+    Keeps an iteration of dictionaries (Solr docs, say) as Columns rather than a list of them.
+    A column is an array while every value is an int (or every value a number, with a float among them),
+    a list otherwise.
+
+    :param results: iterable of dictionaries
+    :param names: columns to start with (fields seen later are added as they turn up)
+    :return: Columns
+    """
+    columns = Columns(names)
+    for row in results:
+        columns.append(row)
+    return columns
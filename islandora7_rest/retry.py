@@ -0,0 +1,132 @@
+# /islandora7_rest/retry.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Staying on Drupal's good side under load:
+#
+#   RetryPolicy      - which failures to try again, and how long to wait first
+#                      (exponential backoff with full jitter, or what Retry-After says)
+#   AdaptiveLimiter  - AIMD cap on requests in flight: creeps up while responses are quick
+#                      and clean, halves when the server pushes back (429/502/503/504,
+#                      timeouts, or slower than latency_target)
+
+import email.utils
+import random
+import threading
+import time
+
+
+class RetryPolicy(object):
+
+    def __init__(self, total=5, backoff_factor=0.5, max_backoff=60,
+                 status_forcelist=(429, 502, 503, 504),
+                 methods=('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'),
+                 respect_retry_after=True):
+        """
+
+        :param total: retries after the first try
+        :param backoff_factor: first retry waits up to this many seconds, doubling each time
+        :param max_backoff: longest wait, Retry-After included
+        :param status_forcelist: HTTP statuses worth another go
+        :param methods: methods safe to send twice.  POST isn't, by default - note that
+            update_datastream is a POST (saying it's a PUT), add it here if you want it retried
+        :param respect_retry_after: wait as long as the server's Retry-After says (up to max_backoff)
+        """
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.status_forcelist = set(status_forcelist)
+        self.methods = set(method.upper() for method in methods)
+        self.respect_retry_after = respect_retry_after
+
+    def can_retry(self, method, attempt, kwargs):
+        """
+        :param method: HTTP method
+        :param attempt: retries made so far
+        :param kwargs: the request's arguments - a streamed body can't be sent twice
+        """
+        if attempt >= self.total or method.upper() not in self.methods:
+            return False
+        data = kwargs.get('data')
+        if data is not None and not isinstance(data, (dict, list, tuple, str, bytes)):
+            return False
+        for value in (kwargs.get('files') or {}).values():
+            if hasattr(value, 'read') or (isinstance(value, tuple) and hasattr(value[1], 'read')):
+                return False
+        return True
+
+    def backoff(self, attempt, response=None):
+        """
+        Seconds to wait before retry number attempt + 1
+        """
+        if response is not None and self.respect_retry_after:
+            retry_after = self._retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return min(self.max_backoff, retry_after)
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+    @staticmethod
+    def _retry_after(value):
+        # Either seconds or an HTTP date
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class AdaptiveLimiter(object):
+
+    def __init__(self, initial=8, minimum=1, maximum=64, latency_target=None, decrease_ratio=0.5, cooldown=1.0):
+        """
+
+        :param initial: requests in flight to start with
+        :param minimum: never go below this many
+        :param maximum: never go above this many
+        :param latency_target: seconds; a slower response counts as the server struggling
+        :param decrease_ratio: limit is multiplied by this when the server pushes back
+        :param cooldown: seconds between decreases, so one burst of failures only counts once
+        """
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease_ratio = decrease_ratio
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency=None, overloaded=False, failed=False):
+        """
+        :param latency: seconds the request took
+        :param overloaded: the server pushed back (429/503, timeout...)
+        :param failed: the request went wrong some other way - the slot is given back, the limit left as it is
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if failed:
+                self._condition.notify_all()
+                return
+            if self.latency_target and latency is not None and latency > self.latency_target:
+                overloaded = True
+            now = time.monotonic()
+            if overloaded:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease_ratio)
+                    self._last_decrease = now
+            else:
+                # Additive increase: about +1 for every `limit` good responses
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
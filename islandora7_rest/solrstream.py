@@ -0,0 +1,91 @@
+# /islandora7_rest/solrstream.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Incremental decoding of Solr JSON responses, for solr_query(..., streaming=True)
+#
+# Solr's JSON comes out as
+#   {"responseHeader": {...}, "response": {"numFound": N, "start": 0, "docs": [ {...}, {...} ]}, "nextCursorMark": "..."}
+# The docs array is the only big part, so we hold on to the text before and after it,
+# and decode the docs one at a time as the bytes arrive.
+
+import codecs
+import json
+import re
+
+_DOCS_START = re.compile(r'"response"\s*:\s*\{.*?"docs"\s*:\s*\[', re.S)
+_SEPARATORS = ' \t\r\n,'
+
+
+class SolrStream(object):
+    """
+    Iterates the docs of a streamed Solr response as they're decoded.
+
+    Everything else (responseHeader, numFound, nextCursorMark...) lands in .envelope
+    once iteration finishes, with response.docs left as an empty list.
+    """
+
+    def __init__(self, response, chunk_size=65536):
+        """
+
+        :param response: a requests response made with stream=True
+        :param chunk_size: bytes read off the socket at a time
+        """
+        self.response = response
+        self.chunk_size = chunk_size
+        self.envelope = None
+        self._chunks = None
+        self._decoder = None
+        self._buffer = ''
+
+    def _fill(self):
+        # Append the next chunk of text to the buffer, False at the end of the body
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                self._buffer += text
+                return True
+        text = self._decoder.decode(b'', final=True)
+        self._buffer += text
+        return bool(text)
+
+    def __iter__(self):
+        self._chunks = self.response.iter_content(self.chunk_size)
+        self._decoder = codecs.getincrementaldecoder(self.response.encoding or 'utf-8')()
+        json_decoder = json.JSONDecoder()
+        try:
+            match = _DOCS_START.search(self._buffer)
+            while match is None:
+                if not self._fill():
+                    raise ValueError("No response.docs in Solr response")
+                match = _DOCS_START.search(self._buffer)
+            prefix = self._buffer[:match.end()]
+            position = match.end()
+
+            while True:
+                while position < len(self._buffer) and self._buffer[position] in _SEPARATORS:
+                    position += 1
+                if position == len(self._buffer):
+                    if not self._fill():
+                        raise ValueError("Solr response ended inside response.docs")
+                    continue
+                if self._buffer[position] == ']':
+                    break
+                try:
+                    doc, position = json_decoder.raw_decode(self._buffer, position)
+                except json.JSONDecodeError:
+                    # Most likely only part of the doc has arrived yet
+                    if not self._fill():
+                        raise
+                    continue
+                yield doc
+                # Drop what's been decoded, so the buffer stays around one doc + one chunk
+                if position > self.chunk_size:
+                    self._buffer = self._buffer[position:]
+                    position = 0
+
+            while self._fill():
+                pass
+            self.envelope = json.loads(prefix + self._buffer[position:])
+        finally:
+            self.response.close()
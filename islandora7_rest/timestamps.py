@@ -0,0 +1,35 @@
+# /islandora7_rest/timestamps.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# Solr timestamps (fgs_lastModifiedDate and friends) as strings that compare correctly, and the
+# high-water marks DeltaSync and RelationshipIndex keep between runs.
+#
+# Solr writes dates with as few fractional digits as it can: 2019-01-02T03:04:05Z, ...:05.5Z,
+# ...:05.51Z, ...:05.512Z.  As strings ".5Z" sorts after ".500Z" but before ".510Z", so they're
+# put back to exactly three digits (Fedora keeps milliseconds) before anything is compared.
+
+import datetime
+
+
+def normalize(timestamp):
+    """
+    :param timestamp: a Solr date string, or None
+    :return: the same instant as YYYY-MM-DDTHH:MM:SS.mmmZ (None and '' are returned as they are)
+    """
+    if not timestamp or not timestamp.endswith('Z'):
+        return timestamp
+    seconds, _, fraction = timestamp[:-1].partition('.')
+    return '{}.{}Z'.format(seconds, (fraction + '000')[:3])
+
+
+def high_water_mark(safety_margin):
+    """
+    Now, less safety_margin seconds, normalized - to be taken at the START of a walk.  The newest
+    timestamp a walk saw won't do: Solr is indexed asynchronously (gsearch) and commits when it
+    gets round to it, so an object changed earlier can still turn up in Solr after the walk.
+
+    :param safety_margin: seconds, for clock skew and Solr commit lag
+    """
+    started = datetime.datetime.utcnow() - datetime.timedelta(seconds=safety_margin)
+    return started.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
@@ -0,0 +1,304 @@
+# /islandora7_rest/transport.py
+# Copyright (c) 2019 The University of Kansas
+# BSD 3-Clause - see LICENSE.txt
+#
+# The connection pool, as something clients can share.
+#
+#   transport = Transport(pool_maxsize=32, idle_timeout=4)
+#   client = IslandoraClient(rest_url, user, token, max_workers=32, transport=transport)
+#   ku_client = IslandoraClientKU(rest_url, user, token, transport=transport)
+#   client.prewarm()
+#
+# v1/ and v1ku/ are the same host, so both clients then draw on one pool of kept-alive connections
+# instead of each opening their own.  Over plain requests/urllib3 that's HTTP/1.1, one request per
+# connection at a time; http2=True swaps in httpx (pip install islandora7-rest[http2]), which runs
+# every request over a single multiplexed connection.
+#
+# Idle connections: Apache closes a kept-alive connection after KeepAliveTimeout (5 seconds by default).
+# Reusing one just as the server drops it fails the request, so idle_timeout should be a little under
+# the server's - connections idle longer than that are closed and reopened rather than reused.
+
+import socket
+import threading
+import time
+
+from contextlib import contextmanager
+
+from requests import exceptions
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.models import Request, Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+def keepalive_options(idle=60, interval=15, count=4):
+    """
+    Socket options turning on TCP keep-alive, so connections held open through quiet spells
+    aren't silently dropped by firewalls and NAT.  The timings are set where the OS allows it.
+    """
+    options = list(HTTPConnection.default_socket_options) + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    for name, value in (('TCP_KEEPIDLE', idle), ('TCP_KEEPINTVL', interval), ('TCP_KEEPCNT', count)):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    # macOS calls TCP_KEEPIDLE TCP_KEEPALIVE
+    if not hasattr(socket, 'TCP_KEEPIDLE') and hasattr(socket, 'TCP_KEEPALIVE'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, idle))
+    return options
+
+
+class _IdleTimeout(object):
+    # Mixed into urllib3's pools: a connection idle in the pool longer than idle_timeout is closed
+    # when it's next taken out (and reconnects on use) rather than trusted
+    idle_timeout = None
+
+    def _get_conn(self, timeout=None):
+        connection = super(_IdleTimeout, self)._get_conn(timeout)
+        returned = getattr(connection, '_islandora_returned', None)
+        if returned is not None and time.monotonic() - returned > self.idle_timeout:
+            connection.close()
+        return connection
+
+    def _put_conn(self, connection):
+        if connection is not None:
+            connection._islandora_returned = time.monotonic()
+        super(_IdleTimeout, self)._put_conn(connection)
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    # So pickling keeps them too
+    __attrs__ = HTTPAdapter.__attrs__ + ['socket_options', 'idle_timeout', 'timeout']
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False, socket_options=None,
+                 idle_timeout=None, timeout=None, **kwargs):
+        """
+        An HTTPAdapter with socket options, an idle timeout and a default request timeout
+
+        :param socket_options: e.g. keepalive_options()
+        :param idle_timeout: seconds a pooled connection may sit unused and still be reused
+        :param timeout: for requests that don't give one - seconds, or (connect, read)
+        """
+        self.socket_options = socket_options
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        super(KeepAliveAdapter, self).__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                               pool_block=pool_block, **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.socket_options is not None:
+            pool_kwargs['socket_options'] = self.socket_options
+        super(KeepAliveAdapter, self).init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        if self.idle_timeout:
+            self.poolmanager.pool_classes_by_scheme = {
+                'http': type('HTTPConnectionPool', (_IdleTimeout, HTTPConnectionPool),
+                             {'idle_timeout': self.idle_timeout}),
+                'https': type('HTTPSConnectionPool', (_IdleTimeout, HTTPSConnectionPool),
+                              {'idle_timeout': self.idle_timeout}),
+            }
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        return super(KeepAliveAdapter, self).send(request, stream=stream,
+                                                  timeout=self.timeout if timeout is None else timeout, **kwargs)
+
+    def prewarm(self, url, connections, verify=True):
+        """
+        Opens connections to url's host ahead of time (TCP and TLS handshakes included), in parallel,
+        and leaves them in the pool.
+
+        :return: connections opened
+        """
+        # The pool requests itself would pick - urllib3 keeps separate pools per TLS setting
+        if hasattr(self, 'get_connection_with_tls_context'):
+            pool = self.get_connection_with_tls_context(Request('GET', url).prepare(), verify)
+        else:
+            pool = self.get_connection(url)
+        connections = min(connections, self._pool_maxsize)
+        opened = []
+        for _ in range(connections):
+            connection = pool._get_conn()
+            if connection.sock is None:
+                opened.append(connection)
+            else:
+                pool._put_conn(connection)
+        threads = [threading.Thread(target=connection.connect) for connection in opened]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for connection in opened:
+            pool._put_conn(connection)
+        return len(opened)
+
+
+@contextmanager
+def _httpx_errors(httpx, request=None):
+    # httpx's exceptions as the requests ones IslandoraSession retries and download_datastream resumes on
+    try:
+        yield
+    except httpx.ConnectTimeout as error:
+        raise exceptions.ConnectTimeout(error, request=request)
+    except httpx.TimeoutException as error:
+        raise exceptions.ReadTimeout(error, request=request)
+    except httpx.TransportError as error:
+        raise exceptions.ConnectionError(error, request=request)
+    except httpx.StreamError as error:
+        raise exceptions.ChunkedEncodingError(error, request=request)
+
+
+class _HTTPXRaw(object):
+    # Just enough of urllib3's response for requests (and download_datastream's readinto)
+
+    def __init__(self, response, httpx):
+        self._response = response
+        self._httpx = httpx
+        self._chunks = response.iter_bytes()
+        self._buffer = b''
+
+    def _next(self):
+        with _httpx_errors(self._httpx):
+            return next(self._chunks, None)
+
+    def read(self, amt=None, decode_content=True):
+        if amt is None:
+            data = [self._buffer]
+            chunk = self._next()
+            while chunk is not None:
+                data.append(chunk)
+                chunk = self._next()
+            self._buffer = b''
+            return b''.join(data)
+        while len(self._buffer) < amt:
+            chunk = self._next()
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def stream(self, amt=65536, decode_content=True):
+        data = self.read(amt)
+        while data:
+            yield data
+            data = self.read(amt)
+
+    def close(self):
+        self._response.close()
+
+    def release_conn(self):
+        self._response.close()
+
+
+class HTTP2Adapter(BaseAdapter):
+
+    def __init__(self, max_connections=10, keepalive_expiry=None, timeout=None, verify=True):
+        """
+        Sends requests through an httpx client with HTTP/2 on - many requests share one connection
+
+        :param max_connections: connections to open at most (HTTP/2 rarely needs more than one per host)
+        :param keepalive_expiry: seconds an idle connection is kept
+        :param timeout: for requests that don't give one - seconds, or (connect, read)
+        :param verify: TLS certificate verification, for the whole client
+        """
+        # Imported here - it's slow to import and most people won't use it
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("http2=True needs httpx: pip install islandora7-rest[http2]")
+        super(HTTP2Adapter, self).__init__()
+        self.httpx = httpx
+        self.timeout = timeout
+        self.client = httpx.Client(http2=True, verify=verify, limits=httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry))
+
+    def _timeout(self, timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return self.httpx.Timeout(read, connect=connect)
+        return self.httpx.Timeout(timeout)
+
+    @staticmethod
+    def _content(body):
+        if body is None or isinstance(body, (bytes, str)):
+            return body
+        if hasattr(body, 'read'):
+            return iter(lambda: body.read(65536), b'')
+        return iter(body)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        outgoing = self.client.build_request(request.method, request.url, headers=dict(request.headers),
+                                             content=self._content(request.body),
+                                             timeout=self._timeout(self.timeout if timeout is None else timeout))
+        with _httpx_errors(self.httpx, request):
+            incoming = self.client.send(outgoing, stream=True)
+        response = Response()
+        response.status_code = incoming.status_code
+        response.reason = incoming.reason_phrase
+        response.headers = CaseInsensitiveDict(incoming.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _HTTPXRaw(incoming, self.httpx)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        if not stream:
+            response.content
+        return response
+
+    def close(self):
+        self.client.close()
+
+    def prewarm(self, url, connections, verify=True):
+        # One connection carries everything, and it's opened on the first request
+        return 0
+
+
+class Transport(object):
+
+    def __init__(self, pool_maxsize=10, pool_connections=10, pool_block=False, keepalive=True, keepalive_idle=60,
+                 keepalive_interval=15, idle_timeout=None, timeout=None, http2=False, verify=True):
+        """
+
+        :param pool_maxsize: connections kept per host - at least the threads that share it
+        :param pool_connections: hosts to keep a pool for
+        :param pool_block: wait for a free connection rather than opening (and then discarding) an extra one
+        :param keepalive: turn on TCP keep-alive
+        :param keepalive_idle: seconds quiet before the first keep-alive probe
+        :param keepalive_interval: seconds between probes
+        :param idle_timeout: seconds a connection may sit unused in the pool and still be reused -
+            a bit under the server's KeepAliveTimeout
+        :param timeout: default request timeout - seconds, or (connect, read); None waits forever
+        :param http2: use httpx with HTTP/2 instead of urllib3
+        :param verify: TLS verification, for http2 (requests' own verify= works as usual otherwise)
+        """
+        self.pool_maxsize = pool_maxsize
+        if http2:
+            self.adapter = HTTP2Adapter(max_connections=pool_maxsize, keepalive_expiry=idle_timeout,
+                                        timeout=timeout, verify=verify)
+        else:
+            self.adapter = KeepAliveAdapter(
+                pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block,
+                socket_options=keepalive_options(keepalive_idle, keepalive_interval) if keepalive else None,
+                idle_timeout=idle_timeout, timeout=timeout)
+
+    def mount(self, session):
+        """ Sends session's http:// and https:// requests through this transport """
+        session.mount('http://', self.adapter)
+        session.mount('https://', self.adapter)
+
+    def prewarm(self, url, connections=None, verify=True):
+        """
+        :param url: any URL on the host
+        :param connections: defaults to pool_maxsize
+        :param verify: as the requests will be sent (a CA bundle path, say) - it decides which pool they use
+        :return: connections opened
+        """
+        return self.adapter.prewarm(url, connections or self.pool_maxsize, verify)
+
+    def close(self):
+        self.adapter.close()
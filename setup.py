@@ -18,5 +18,11 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     install_requires=['requests>=2.5,<3', 'python-dotenv'],
-    python_requires='>=3'
+    extras_require={
+        'async': ['aiohttp>=3.6'],
+        'pandas': ['pandas'],
+        'arrow': ['pyarrow'],
+        'http2': ['httpx[http2]'],
+    },
+    python_requires='>=3.7'
 )
@@ -0,0 +1,21 @@
+# conftest.py
+# islandora7_rest tests
+# Copyright (c) 2019 The University of Kansas
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import mock_server  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def repository():
+    """ A mock islandora_rest server (benchmarks/mock_server.py) - (server, rest_url) """
+    server, rest_url = mock_server.start('127.0.0.1', 0, docs=95)
+    yield server, rest_url
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,97 @@
+# test_bulkpurge.py
+# islandora7_rest tests
+# Copyright (c) 2019 The University of Kansas
+
+import re
+
+import requests
+
+from islandora7_rest import IslandoraClient
+from islandora7_rest.BulkPurge import BulkPurge, PurgePlan
+
+MEMBER = 'RELS_EXT_isMemberOfCollection_uri_ms'
+
+
+class StubClient(object):
+    # Solr answered from a {pid: [parents]} map, deletes recorded
+    max_workers = 4
+    _chunks = staticmethod(IslandoraClient._chunks)
+    _terms_query = IslandoraClient._terms_query
+
+    def __init__(self, parents, failing=(), solr_terms_parser=True):
+        self.solr_terms_parser = solr_terms_parser
+        self.docs = [{'PID': pid, MEMBER: ['info:fedora/' + parent for parent in its]} for pid, its in parents.items()]
+        self.failing = set(failing)
+        self.deleted = []
+
+    def solr_generator(self, query, **params):
+        if self.solr_terms_parser:
+            field, values = re.match(r'\{!terms f=(\S+)\}(.*)', query).groups()
+            values = set(values.split(','))
+        else:
+            terms = re.findall(r'(\w+):"((?:[^"\\]|\\.)*)"', query)
+            field = terms[0][0]
+            values = set(re.sub(r'\\(.)', r'\1', value) for name, value in terms)
+        if field == 'PID':
+            return [doc for doc in self.docs if doc['PID'] in values]
+        return [doc for doc in self.docs if values & set(doc.get(field, ()))]
+
+    def delete_object(self, pid):
+        if pid in self.failing:
+            response = requests.Response()
+            response.status_code = 500
+            raise requests.HTTPError('500', response=response)
+        self.deleted.append(pid)
+
+
+def test_heights_with_cycles():
+    children = {'root': ['a', 'b'], 'a': ['b'], 'b': ['c'], 'c': ['a'], 'd': ['d'], 'e': []}
+    heights = BulkPurge._heights(children)
+    assert sorted(heights) == sorted(children)
+    assert heights['e'] == 0 and heights['d'] == 0
+    assert heights['root'] > max(heights['a'], heights['b'])
+
+
+def test_heights_deep_chain_without_recursion():
+    children = dict(('n{}'.format(index), ['n{}'.format(index + 1)]) for index in range(5000))
+    children['n5000'] = []
+    assert BulkPurge._heights(children)['n0'] == 5000
+
+
+def test_plan_orders_members_first_and_keeps_shared():
+    client = StubClient({'root': [], 'a': ['root'], 'b': ['root'], 'a1': ['a'], 'a2': ['a', 'a1'],
+                         'shared': ['b', 'elsewhere'], 'under-shared': ['shared'], 'loop': ['root', 'loop2'],
+                         'loop2': ['loop']})
+    plan = BulkPurge(client).plan(root='root')
+    assert plan.kept == {'shared': 'also a member of elsewhere', 'under-shared': 'under shared'}
+    order = list(plan)
+    assert sorted(order) == ['a', 'a1', 'a2', 'b', 'loop', 'loop2', 'root']
+    assert order.index('a2') < order.index('a1') < order.index('a') < order.index('root')
+    assert order[-1] == 'root'
+    assert not BulkPurge(client, keep_shared=False).plan(root='root').kept
+
+
+def test_or_query_for_solr_before_terms_parser():
+    client = StubClient({}, solr_terms_parser=False)
+    assert client._terms_query('PID', ['ku:1', 'ku:"2"']) == '(PID:"ku:1" OR PID:"ku:\\"2\\"")'
+    client = StubClient({'root': [], 'a': ['root'], 'a1': ['a'], 'b': ['root']}, solr_terms_parser=False)
+    assert sorted(BulkPurge(client).plan(root='root')) == ['a', 'a1', 'b', 'root']
+
+
+def test_failed_member_holds_back_its_parents_and_journal_resumes(tmp_path):
+    parents = {'root': [], 'a': ['root'], 'b': ['root'], 'a1': ['a'], 'b1': ['b']}
+    client = StubClient(parents, failing=['a1'])
+    journal = str(tmp_path / 'purge.jsonl')
+    purge = BulkPurge(client, journal=journal)
+    plan = purge.plan(root='root')
+    plan.write(str(tmp_path / 'plan.json'))
+    results = dict((batch_result.item, batch_result) for batch_result in purge.purge(plan))
+    purge.close()
+    assert sorted(client.deleted) == ['b', 'b1']
+    assert not results['a'].ok and not results['root'].ok
+
+    client = StubClient(parents)
+    purge = BulkPurge(client, journal=journal)
+    list(purge.purge(PurgePlan.load(str(tmp_path / 'plan.json'))))
+    purge.close()
+    assert client.deleted == ['a1', 'a', 'root']
@@ -0,0 +1,78 @@
+# test_cache.py
+# islandora7_rest tests
+# Copyright (c) 2019 The University of Kansas
+
+import time
+
+import pytest
+
+from islandora7_rest import IslandoraClient
+from islandora7_rest.cache import MemoryCache, SqliteCache
+
+
+def requests_made(server):
+    return server.RequestHandlerClass.repository.requests
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        yield MemoryCache(ttl=0.3)
+    else:
+        cache = SqliteCache(str(tmp_path / 'cache.db'), ttl=0.3)
+        yield cache
+        cache.close()
+
+
+def test_stale_entries_revalidated_by_one_profile(repository, cache):
+    server, rest_url = repository
+    client = IslandoraClient(rest_url, 'user', 'token', cache=cache)
+    client.get_object('bench:1')
+    client.get_relationships('bench:1')
+    for dsid in ('OBJ', 'MODS', 'DC'):
+        client.get_datastream_info('bench:1', dsid)
+    time.sleep(0.4)
+
+    before = requests_made(server)
+    client.get_relationships('bench:1')
+    for dsid in ('OBJ', 'MODS', 'DC'):
+        client.get_datastream_info('bench:1', dsid)
+    # The profile, once - it vouches for the rest
+    assert requests_made(server) - before == 1
+
+
+def test_changed_datastream_fetched_again(repository, cache):
+    server, rest_url = repository
+    repository_state = server.RequestHandlerClass.repository
+    client = IslandoraClient(rest_url, 'user', 'token', cache=cache)
+    client.get_object('bench:2')
+    assert client.get_datastream_info('bench:2', 'OBJ')['checksum'] == repository_state.checksum
+    time.sleep(0.4)
+
+    original = repository_state.checksum
+    repository_state.checksum = 'changed'
+    try:
+        before = requests_made(server)
+        assert client.get_datastream_info('bench:2', 'OBJ')['checksum'] == 'changed'
+        assert requests_made(server) - before == 2
+    finally:
+        repository_state.checksum = original
+
+
+def test_read_overtaken_by_a_change_is_not_cached(repository, cache):
+    server, rest_url = repository
+    client = IslandoraClient(rest_url, 'user', 'token', cache=cache)
+    get = client.get
+
+    def changed_meanwhile(url, **kwargs):
+        response = get(url, **kwargs)
+        # Another thread changes the object while this read's response is on its way
+        client._invalidate('bench:3')
+        return response
+
+    client.get = changed_meanwhile
+    client.get_object('bench:3')
+    client.get = get
+    assert cache.get(client._profile_key('bench:3')) is None
+    client.get_object('bench:3')
+    assert cache.get(client._profile_key('bench:3')) is not None
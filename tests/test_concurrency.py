@@ -0,0 +1,94 @@
+# test_concurrency.py
+# islandora7_rest tests
+# Copyright (c) 2019 The University of Kansas
+
+import threading
+import time
+
+import pytest
+
+from islandora7_rest.concurrency import imap_unordered, merged, pipelined, prefetched
+
+
+def test_imap_unordered_keeps_errors_with_their_items():
+    def half(number):
+        if number % 2:
+            raise ValueError(number)
+        return number // 2
+
+    results = dict((batch_result.item, batch_result) for batch_result in imap_unordered(half, range(20), 4))
+    assert sorted(results) == list(range(20))
+    assert all(results[number].result == number // 2 for number in range(0, 20, 2))
+    assert all(isinstance(results[number].error, ValueError) and not results[number].ok
+               for number in range(1, 20, 2))
+
+
+def test_prefetched_reraises_in_order():
+    def pages():
+        yield 1
+        yield 2
+        raise KeyError('page 3')
+
+    consumed = []
+    with pytest.raises(KeyError):
+        for page in prefetched(pages(), 2):
+            consumed.append(page)
+    assert consumed == [1, 2]
+
+
+def test_merged_interleaves_everything():
+    factories = [lambda start=start: range(start, start + 100) for start in range(0, 500, 100)]
+    assert sorted(merged(factories, max_workers=3, buffer_size=7)) == list(range(500))
+
+
+def test_merged_error_stops_the_lot():
+    def failing():
+        yield 'fine'
+        raise RuntimeError('shard failed')
+
+    def endless():
+        while True:
+            yield 'more'
+
+    with pytest.raises(RuntimeError, match='shard failed'):
+        for _ in merged([endless, failing], max_workers=2, buffer_size=1):
+            pass
+
+
+def test_pipelined_results_and_errors():
+    def parse(item):
+        if item == 3:
+            raise ValueError('bad item')
+        return item * 10
+
+    def store(value):
+        if value == 50:
+            raise IOError('store failed')
+        return value + 1
+
+    results = dict((batch_result.item, batch_result) for batch_result in pipelined(range(8), [(parse, 2), (store, 3)]))
+    assert sorted(results) == list(range(8))
+    assert isinstance(results[3].error, ValueError)
+    assert isinstance(results[5].error, IOError)
+    assert dict((item, results[item].result) for item in results if results[item].ok) == \
+        {0: 1, 1: 11, 2: 21, 4: 41, 6: 61, 7: 71}
+
+
+def test_pipelined_reraises_feed_errors():
+    def items():
+        yield 1
+        raise RuntimeError('manifest unreadable')
+
+    with pytest.raises(RuntimeError, match='manifest unreadable'):
+        list(pipelined(items(), [(lambda item: item, 1)]))
+
+
+def test_pipelined_early_close_stops_the_threads():
+    before = threading.active_count()
+    results = pipelined(iter(range(10 ** 9)), [(lambda item: item, 2), (lambda item: item, 2)], queue_size=2)
+    next(results)
+    results.close()
+    deadline = time.monotonic() + 5
+    while threading.active_count() > before and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert threading.active_count() <= before
@@ -0,0 +1,60 @@
+# test_cursor.py
+# islandora7_rest tests
+# Copyright (c) 2019 The University of Kansas
+
+import pytest
+
+from islandora7_rest import IslandoraClient
+from islandora7_rest.cursor import SolrCursor
+
+ALL = ['bench:{:07d}'.format(index) for index in range(95)]
+
+
+def walk(client, stop_after=None, **params):
+    pids = []
+    for doc in client.solr_generator('*:*', fl='PID', rows=10, **params):
+        if stop_after is not None and len(pids) == stop_after:
+            break
+        pids.append(doc['PID'])
+    return pids
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('stop_after', [1, 10, 23, 94])
+def test_checkpoint_resume_neither_repeats_nor_skips(repository, tmp_path, streaming, stop_after):
+    server, rest_url = repository
+    client = IslandoraClient(rest_url)
+    checkpoint = str(tmp_path / 'walk.json')
+    first = walk(client, stop_after, checkpoint=checkpoint, checkpoint_every=7, streaming=streaming)
+    assert SolrCursor.load(checkpoint).count == stop_after
+    rest = walk(client, checkpoint=checkpoint, checkpoint_every=7, streaming=streaming)
+    assert first + rest == ALL
+    assert SolrCursor.load(checkpoint).done
+
+
+def test_checkpoint_saved_when_the_consumer_raises(repository, tmp_path):
+    server, rest_url = repository
+    client = IslandoraClient(rest_url)
+    checkpoint = str(tmp_path / 'walk.json')
+    handled = []
+    with pytest.raises(RuntimeError):
+        for doc in client.solr_generator('*:*', fl='PID', rows=10, checkpoint=checkpoint, checkpoint_every=1000):
+            if len(handled) == 31:
+                raise RuntimeError("consumer failed")
+            handled.append(doc['PID'])
+    # The doc being handled when it failed comes round again, nothing before it does
+    assert walk(client, checkpoint=checkpoint) == ALL[31:]
+
+
+def test_cursor_object_tracks_offset_within_page(repository):
+    server, rest_url = repository
+    client = IslandoraClient(rest_url)
+    cursor = SolrCursor('*:*', {'fl': 'PID', 'rows': 10, 'sort': 'PID asc'})
+    first = []
+    for doc in client.solr_generator(cursor=cursor):
+        if len(first) == 14:
+            break
+        first.append(doc['PID'])
+    assert (cursor.offset, cursor.count) == (4, 14)
+    resumed = SolrCursor.from_dict(cursor.to_dict())
+    assert first + [doc['PID'] for doc in client.solr_generator(cursor=resumed)] == ALL
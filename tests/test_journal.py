@@ -0,0 +1,31 @@
+# test_journal.py
+# islandora7_rest tests
+# Copyright (c) 2019 The University of Kansas
+
+from islandora7_rest.journal import Journal
+
+
+def test_rerun_after_a_line_cut_off(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    with Journal(path) as journal:
+        journal.record('a', pid='ku:1')
+        journal.record('b', pid='ku:2')
+    # A crash part way through writing b
+    with open(path, 'rb+') as handle:
+        handle.truncate(len(handle.read()) - 10)
+
+    with Journal(path) as journal:
+        assert journal.is_done('a') and not journal.is_done('b')
+        journal.record('c', pid='ku:3')
+    with Journal(path) as journal:
+        assert sorted(journal.entries) == ['a', 'c']
+        assert journal.get('c')['pid'] == 'ku:3'
+
+
+def test_later_entries_win(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    with Journal(path) as journal:
+        journal.record('a', 'failed', error='boom')
+        journal.record('a', pid='ku:1')
+    with Journal(path) as journal:
+        assert journal.is_done('a') and journal.get('a')['pid'] == 'ku:1'
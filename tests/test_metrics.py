@@ -0,0 +1,28 @@
+import gc
+
+import requests
+
+from islandora7_rest.metrics import Metrics
+
+
+def test_prometheus_exports_statuses():
+    metrics = Metrics()
+    metrics.record('v1/object/{pid}', 'GET', 0.01, status=200)
+    metrics.record('v1/object/{pid}', 'GET', 0.02, status=404)
+    metrics.record('v1/object/{pid}', 'GET', 0.5, error=requests.exceptions.ConnectionError())
+    text = metrics.prometheus()
+    assert 'islandora_rest_responses_total{endpoint="v1/object/{pid}",status="200"} 1' in text
+    assert 'islandora_rest_responses_total{endpoint="v1/object/{pid}",status="404"} 1' in text
+    assert 'islandora_rest_responses_total{endpoint="v1/object/{pid}",status="ConnectionError"} 1' in text
+
+
+def test_attached_sessions_are_not_kept_alive():
+    metrics = Metrics()
+    session = requests.Session()
+    metrics.attach(session)
+    assert len(metrics._sessions) == 1
+    session.close()
+    del session
+    gc.collect()
+    assert len(metrics._sessions) == 0
+    assert metrics.connections() == {}
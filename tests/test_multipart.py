@@ -0,0 +1,74 @@
+# test_multipart.py
+# islandora7_rest tests
+# Copyright (c) 2019 The University of Kansas
+
+import hashlib
+import io
+import re
+
+import pytest
+
+from islandora7_rest.multipart import MultipartUpload
+
+DATA = bytes(range(256)) * 1000 + b'tail'
+FIELDS = {'dsid': 'OBJ', 'label': 'Ünïcödé label', 'mimeType': 'application/octet-stream'}
+
+
+def parts(upload, body):
+    # {name: value} of the form fields, and the file part's bytes
+    boundary = upload.boundary.encode('ascii')
+    assert body.endswith(b'--' + boundary + b'--\r\n')
+    found = {}
+    for part in body.split(b'--' + boundary)[1:-1]:
+        head, value = part[2:-2].split(b'\r\n\r\n', 1)
+        found[re.search(rb'name="([^"]+)"', head).group(1).decode('utf-8')] = value
+    return found
+
+
+def read_all(upload, size):
+    body = b''
+    data = upload.read(size)
+    while data:
+        body += data
+        data = upload.read(size)
+    return body
+
+
+@pytest.mark.parametrize('checksum_type,hasher', [(None, None), ('MD5', hashlib.md5), ('SHA-256', hashlib.sha256)])
+@pytest.mark.parametrize('source', ['path', 'file'])
+def test_content_length_and_checksum(tmp_path, checksum_type, hasher, source):
+    path = tmp_path / 'image.tif'
+    path.write_bytes(DATA)
+    upload = MultipartUpload(FIELDS, str(path) if source == 'path' else open(str(path), 'rb'),
+                             checksum_type=checksum_type, chunk_size=4096)
+    body = read_all(upload, 1000)
+    # What requests sends as Content-Length must be exactly what's read
+    assert upload.len == len(body)
+    found = parts(upload, body)
+    assert found['file'] == DATA
+    assert found['dsid'] == b'OBJ' and found['label'] == FIELDS['label'].encode('utf-8')
+    if hasher:
+        assert found['checksum'].decode('ascii') == hasher(DATA).hexdigest() == upload.checksum
+    else:
+        assert 'checksum' not in found and upload.checksum is None
+
+
+def test_unknown_size_goes_chunked():
+    chunks = [DATA[start:start + 5000] for start in range(0, len(DATA), 5000)]
+    progress = []
+    upload = MultipartUpload({'dsid': 'OBJ'}, iter(chunks), checksum_type='MD5',
+                             progress=lambda sent, total: progress.append((sent, total)))
+    assert not hasattr(upload, 'len')
+    found = parts(upload, b''.join(upload))
+    assert found['file'] == DATA
+    assert found['checksum'].decode('ascii') == hashlib.md5(DATA).hexdigest()
+    assert progress[-1] == (len(DATA), None)
+
+
+def test_seekable_stream_from_its_position():
+    source = io.BytesIO(b'skip me' + DATA)
+    source.seek(len(b'skip me'))
+    upload = MultipartUpload({}, source)
+    body = read_all(upload, 65536)
+    assert upload.len == len(body)
+    assert parts(upload, body)['file'] == DATA
@@ -0,0 +1,70 @@
+# test_solrstream.py
+# islandora7_rest tests
+# Copyright (c) 2019 The University of Kansas
+
+import json
+
+import pytest
+
+from islandora7_rest.solrstream import SolrStream
+
+
+class FakeResponse(object):
+    # Just what SolrStream uses of a streamed requests response
+
+    def __init__(self, body, chunk):
+        self.body = body
+        self.chunk = chunk
+        self.encoding = 'utf-8'
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), self.chunk):
+            yield self.body[start:start + self.chunk]
+
+    def close(self):
+        self.closed = True
+
+
+DOCS = [
+    {'PID': 'ku:1', 'dc.title': ['Plain']},
+    {'PID': 'ku:2', 'dc.title': ['Braces } and ] and "quotes" in strings']},
+    {'PID': 'ku:3', 'dc.title': ['Ünïcödé – 漢字 😀']},
+    {'PID': 'ku:4', 'nested': {'a': [1, 2, {'b': None}]}, 'size': 12345678901},
+]
+SOLR = {
+    'responseHeader': {'status': 0, 'params': {'q': '*:*'}},
+    'response': {'numFound': 4, 'start': 0, 'docs': DOCS},
+    'nextCursorMark': 'AoE=',
+}
+
+
+@pytest.mark.parametrize('chunk', [1, 2, 3, 7, 64, 100000])
+def test_docs_split_across_chunks(chunk):
+    response = FakeResponse(json.dumps(SOLR, ensure_ascii=False, indent=1).encode('utf-8'), chunk)
+    stream = SolrStream(response, chunk_size=16)
+    assert list(stream) == DOCS
+    assert stream.envelope['nextCursorMark'] == 'AoE='
+    assert stream.envelope['response']['numFound'] == 4
+    assert stream.envelope['response']['docs'] == []
+    assert response.closed
+
+
+def test_no_docs():
+    empty = dict(SOLR, response={'numFound': 0, 'start': 0, 'docs': []})
+    stream = SolrStream(FakeResponse(json.dumps(empty).encode('utf-8'), 5))
+    assert list(stream) == []
+    assert stream.envelope['nextCursorMark'] == 'AoE='
+
+
+def test_truncated_response_raises():
+    body = json.dumps(SOLR).encode('utf-8')
+    response = FakeResponse(body[:body.index(b'ku:3')], 10)
+    with pytest.raises(ValueError):
+        list(SolrStream(response))
+    assert response.closed
+
+
+def test_not_a_solr_response_raises():
+    with pytest.raises(ValueError):
+        list(SolrStream(FakeResponse(b'{"error": "nope"}', 4)))
@@ -0,0 +1,27 @@
+# test_timestamps.py
+# islandora7_rest tests
+# Copyright (c) 2019 The University of Kansas
+
+from islandora7_rest.timestamps import high_water_mark, normalize
+
+
+def test_normalize_pads_the_fraction():
+    assert normalize('2019-01-02T03:04:05Z') == '2019-01-02T03:04:05.000Z'
+    assert normalize('2019-01-02T03:04:05.5Z') == '2019-01-02T03:04:05.500Z'
+    assert normalize('2019-01-02T03:04:05.51Z') == '2019-01-02T03:04:05.510Z'
+    assert normalize('2019-01-02T03:04:05.512Z') == '2019-01-02T03:04:05.512Z'
+    assert normalize(None) is None and normalize('') == ''
+
+
+def test_normalized_strings_sort_as_times():
+    solr = ['2019-01-02T03:04:05.51Z', '2019-01-02T03:04:05Z', '2019-01-02T03:04:05.5Z', '2019-01-02T03:04:05.05Z',
+            '2019-01-02T03:04:06Z']
+    assert sorted(solr, key=normalize) == ['2019-01-02T03:04:05Z', '2019-01-02T03:04:05.05Z',
+                                           '2019-01-02T03:04:05.5Z', '2019-01-02T03:04:05.51Z',
+                                           '2019-01-02T03:04:06Z']
+
+
+def test_high_water_mark_is_normalized_and_earlier():
+    mark = high_water_mark(300)
+    assert normalize(mark) == mark
+    assert mark < high_water_mark(0)